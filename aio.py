@@ -0,0 +1,582 @@
+"""
+asyncio versions of the Gatherer and Scanner, on aiohttp.
+
+    gatherer = AsyncGatherer(domain, True, root_page, GatherLevel(...))
+    async with AsyncScanner(gatherer) as scanner:
+        scanner.add_level(ScanLevel("article", "class", "single"))
+        await scanner.collect_links()
+        async for scan_result in scanner.iter_scan():
+            ...
+
+They use the same GatherLevel, ScanLevel and ScanResult as pyblix.py but no
+gevent: nothing gets monkey-patched and everything runs on the loop that
+awaits it, next to the caller's own tasks. Constructing them does no I/O, the
+index is only fetched by the first gather() or iter_gather_links().
+
+All requests go through one aiohttp.ClientSession, which keeps connections
+alive per host. Pass your own `session` to share it or to set other connector
+limits, a session created here is closed by close() or `async with`.
+
+Pages are parsed, and a ResultStore is written, on a worker thread, so neither
+holds up the other tasks on the loop.
+"""
+import asyncio
+import functools
+import threading
+import urllib.parse
+from collections import Counter, deque
+
+import aiohttp
+import requests
+
+from core import CheckOutcome, GatherBase, GatherLevel, PageTemplate, ScanBase
+from exceptions import (
+    InvalidParentLevelException,
+    InvalidTargetException,
+    NoLinksInScanLevel,
+)
+from metrics import Metrics
+from parsers import extract_links, parse_levels, resolve_backend
+from result_store import ResultStore
+from scheduler import RETRY_STATUS_CODES, HostScheduler, LinkTask, parse_retry_after
+
+
+def as_requests_exception(exception: Exception) -> Exception:
+    """
+        The requests exception matching an aiohttp failure, so results read
+        the same as with the gevent Scanner. Anything else is returned as is.
+    """
+    if isinstance(exception, aiohttp.ClientSSLError):
+        translated = requests.exceptions.SSLError
+    elif isinstance(exception, (aiohttp.InvalidURL, UnicodeError, ValueError)):
+        translated = requests.exceptions.InvalidURL
+    elif isinstance(exception, aiohttp.ConnectionTimeoutError):
+        translated = requests.exceptions.ConnectTimeout
+    elif isinstance(exception, asyncio.TimeoutError):
+        translated = requests.exceptions.ReadTimeout
+    elif isinstance(exception, aiohttp.ClientError):
+        translated = requests.exceptions.ConnectionError
+    else:
+        return exception
+    error = translated(str(exception) or type(exception).__name__)
+    error.__cause__ = exception
+    return error
+
+
+def _socket_timeout(timeout: float) -> aiohttp.ClientTimeout:
+    # What requests' timeout means: connecting and every read get `timeout`
+    # seconds, a slow but steady download doesn't fail however long it takes.
+    return aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+
+
+def _request_finished(metrics: Metrics, event, response, size: int = None):
+    # Metrics reads requests' Response, hand it what it would have found there.
+    event.status_code = response.status
+    event.redirects = len(response.history)
+    metrics.request_finished(event, size=size)
+
+
+def _settle(future: asyncio.Future, result, exception):
+    if future.cancelled():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class Worker(object):
+    """
+        A thread that runs blocking calls one at a time, off the loop. Not a
+        ThreadPoolExecutor: once gevent has patched `queue`, which importing
+        pyblix does, the executor's idle threads die and the loop waits on
+        them forever. One thread is enough, parsing holds the GIL anyway, and
+        it keeps sqlite calls from interleaving.
+    """
+
+    def __init__(self):
+        self._calls = deque()
+        self._ready = threading.Condition()
+        self._thread = None
+
+    def run(self, function, *args) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._ready:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._serve, daemon=True)
+                self._thread.start()
+            self._calls.append((loop, future, function, args))
+            self._ready.notify()
+        return future
+
+    def _serve(self):
+        while True:
+            with self._ready:
+                while not self._calls:
+                    self._ready.wait()
+                call = self._calls.popleft()
+            if call is None:
+                return
+            loop, future, function, args = call
+            try:
+                result = function(*args)
+            except BaseException as ex:
+                loop.call_soon_threadsafe(_settle, future, None, ex)
+            else:
+                loop.call_soon_threadsafe(_settle, future, result, None)
+
+    def stop(self):
+        with self._ready:
+            if self._thread is not None:
+                self._calls.append(None)
+                self._ready.notify()
+                self._thread = None
+
+
+class AsyncActivity(object):
+    """
+        Lazily opens, and owns, the ClientSession when none was given, and
+        the Worker for blocking calls.
+    """
+
+    session = None
+    _owns_session = False
+    timeout = None
+    _worker = None
+
+    def _off_loop(self, function, *args) -> asyncio.Future:
+        if self._worker is None:
+            self._worker = Worker()
+        return self._worker.run(function, *args)
+
+    def _client(self) -> aiohttp.ClientSession:
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+            self._owns_session = True
+        return self.session
+
+    async def _get(self, url: str, phase: str):
+        """GET `url` and read the body, returns (response, body)."""
+        event = self.metrics.request_started(phase, "GET", url)
+        try:
+            async with self._client().get(
+                url,
+                headers=self.request_headers,
+                ssl=self.verify_ssl,
+                timeout=self.timeout,
+            ) as response:
+                body = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            error = as_requests_exception(ex)
+            self.metrics.request_finished(event, exception=error)
+            raise error
+        _request_finished(self.metrics, event, response, len(body))
+        return response, body
+
+    async def close(self):
+        if self._owns_session:
+            await self.session.close()
+            self.session = None
+            self._owns_session = False
+        if self._worker is not None:
+            self._worker.stop()
+            self._worker = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncGatherer(AsyncActivity, GatherBase):
+    """
+        pyblix.Gatherer for asyncio. Takes the same arguments, minus `lazy`:
+        nothing is fetched until gather() or iter_gather_links() is awaited.
+        An index page fails when connecting or any read takes longer than
+        `timeout` seconds, as with requests.
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        verify_ssl: bool,
+        article_root_page: str,
+        parent_level: GatherLevel,
+        verbose: bool = False,
+        parser: str = "html.parser",
+        root_pages: list = None,
+        pagination=None,
+        index_workers: int = 4,
+        session: aiohttp.ClientSession = None,
+        metrics: Metrics = None,
+        timeout: int = 3,
+    ):
+        super(AsyncGatherer, self).__init__(
+            domain,
+            verify_ssl,
+            article_root_page,
+            parent_level,
+            verbose,
+            parser,
+            root_pages,
+            pagination,
+            index_workers,
+        )
+        self.session = session
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.timeout = _socket_timeout(timeout)
+
+    async def _parse_index(self, response, body):
+        return await self._off_loop(
+            parse_levels, body, self._index_levels, self.parser, response.charset
+        )
+
+    async def gather(self) -> list:
+        async for _ in self.iter_gather_links():
+            pass
+        return self.gather_links
+
+    async def iter_gather_links(self):
+        """
+            Yield every article as soon as the index page listing it comes in.
+            The first call does the crawling, later calls replay gather_links.
+        """
+        if self._gathered:
+            for gather_link in self.gather_links:
+                yield gather_link
+            return
+
+        root_soup = await self._read_root_page()
+        for gather_link in self.gather_links:
+            yield gather_link
+
+        if len(self.root_pages) > 1 or self.pagination is not None:
+            async for gather_link in self._crawl_index_pages(root_soup):
+                yield gather_link
+        self._gathered = True
+
+    async def _read_root_page(self):
+        if self.verbose:
+            print(f"Validating URL: {self.article_root_page}")
+        response, body = await self._get(self.article_root_page, "index_fetch")
+        if response.status != 200:
+            raise InvalidTargetException
+
+        if self.verbose:
+            print(f"Validating parent level: {self.identifiable_parent_level}")
+        soup = await self._parse_index(response, body)
+        parent = self._find_parent_level(soup)
+        if parent is None:
+            raise InvalidParentLevelException
+        self._add_gather_links(parent.find_all("a"), self.article_root_page)
+        return soup
+
+    async def _fetch_index_page(self, url: str, root: str, slots, arrived):
+        async with slots:
+            try:
+                response, body = await self._get(url, "index_fetch")
+            except requests.exceptions.RequestException:
+                response, body = None, None
+        arrived.put_nowait((url, root, response, body))
+
+    async def _crawl_index_pages(self, root_soup):
+        # Same walk as Gatherer._crawl_index_pages, with tasks for greenlets.
+        slots = asyncio.Semaphore(self.index_workers)
+        arrived = asyncio.Queue()
+        requested = {self.article_root_page}
+        fetching = set()
+        in_flight = Counter()
+        numbered = {}
+
+        def request(url, root):
+            if url is not None and url not in requested:
+                requested.add(url)
+                in_flight[root] += 1
+                task = asyncio.ensure_future(
+                    self._fetch_index_page(url, root, slots, arrived)
+                )
+                fetching.add(task)
+                task.add_done_callback(fetching.discard)
+
+        def top_up(root):
+            pages = numbered.get(root)
+            while pages is not None and in_flight[root] < self.index_workers:
+                url = next(pages, None)
+                if url is None:
+                    del numbered[root]
+                    return
+                request(url, root)
+
+        if isinstance(self.pagination, PageTemplate):
+            numbered = {root: self.pagination.pages(root) for root in self.root_pages}
+        for root in self.root_pages[1:]:
+            request(root, root)
+        request(
+            self._next_page(root_soup, self.article_root_page), self.article_root_page
+        )
+        for root in list(numbered):
+            top_up(root)
+
+        try:
+            while sum(in_flight.values()):
+                url, root, response, body = await arrived.get()
+                in_flight[root] -= 1
+
+                if response is None or response.status != 200:
+                    if url == root:
+                        raise InvalidTargetException
+                    numbered.pop(root, None)
+                    continue
+
+                soup = await self._parse_index(response, body)
+                parent = self._find_parent_level(soup)
+                if parent is None:
+                    if url == root:
+                        raise InvalidParentLevelException
+                    numbered.pop(root, None)
+                    continue
+
+                if self.verbose:
+                    print(f"Gathering articles from index page {url}")
+                for gather_link in self._add_gather_links(parent.find_all("a"), url):
+                    yield gather_link
+                request(self._next_page(soup, url), root)
+                top_up(root)
+        finally:
+            for task in list(fetching):
+                task.cancel()
+
+
+class AsyncScanner(AsyncActivity, ScanBase):
+    """
+        pyblix.Scanner for asyncio.
+
+        Articles are fetched `fetch_workers` at a time while the gatherer is
+        still enumerating them, and parsed on a Worker thread so a large
+        article doesn't hold up the other tasks on the loop.
+
+        Links are checked with GET, `scan_workers` at a time, released by a
+        HostScheduler just like LinkChecker does: every host within its limits,
+        and 429/503 answers requeued after their Retry-After. Thousands of
+        checks only cost a task each while they are in flight.
+
+        Every fetch, articles and links alike, fails when connecting or any
+        read takes longer than `timeout` seconds. Link checks don't download
+        the body, the status is all they need.
+        Without a `session` the gatherer's is used, and closing the scanner
+        closes the gatherer too.
+    """
+
+    def __init__(
+        self,
+        gatherer: AsyncGatherer,
+        timeout: int = 3,
+        fetch_workers: int = 8,
+        scan_workers: int = 100,
+        sort_query: bool = False,
+        parser: str = "html.parser",
+        scheduler: HostScheduler = None,
+        session: aiohttp.ClientSession = None,
+        metrics: Metrics = None,
+        result_store: ResultStore = None,
+    ):
+        super(AsyncScanner, self).__init__(
+            gatherer.verbose,
+            gatherer.domain,
+            gatherer.verify_ssl,
+            sort_query=sort_query,
+            result_store=result_store,
+        )
+        self._for_gatherer = gatherer
+        self.all_articles = gatherer.gather_links
+        self.request_headers = gatherer.request_headers
+
+        self.timeout = _socket_timeout(timeout)
+        self.fetch_workers = fetch_workers
+        self.scan_workers = scan_workers
+        self.parser = resolve_backend(parser)
+        self.scheduler = scheduler if scheduler is not None else HostScheduler()
+        self.session = session
+        if metrics is None:
+            metrics = getattr(gatherer, "metrics", None) or Metrics()
+        self.metrics = metrics
+
+    async def _in_store(self, function, *args):
+        """Call `function`, off the loop when it may touch the ResultStore."""
+        if self.result_store is None:
+            return function(*args)
+        return await self._off_loop(function, *args)
+
+    def _client(self) -> aiohttp.ClientSession:
+        if self.session is None:
+            return self._for_gatherer._client()
+        return self.session
+
+    async def close(self):
+        await super(AsyncScanner, self).close()
+        await self._for_gatherer.close()
+
+    async def _collect_article(self, position: int, article, slots, chunks: list):
+        try:
+            if self.verbose:
+                print(f"Getting links for article: {article}")
+            response, body = await self._get(article.link, "article_fetch")
+        finally:
+            slots.release()
+        hist = response.history
+        await self._in_store(
+            self._record_page,
+            article,
+            hist[0].status if len(hist) > 0 else response.status,
+            str(response.url),
+        )
+
+        parse = functools.partial(
+            extract_links,
+            body,
+            self._level_specs,
+            self.parser,
+            encoding=response.charset,
+        )
+        anchors, links, _ = await self._off_loop(parse)
+        first_result = len(self._all_results)
+        await self._in_store(self._record_links, article, anchors, links)
+        chunks.append((position, self._all_results[first_result:]))
+
+    async def collect_links(self):
+        if len(self.scan_levels) == 0:
+            raise NoLinksInScanLevel
+
+        if self.result_store is not None:
+            await self._in_store(self.result_store.clear)
+        self.fetched_pages = {}
+        chunks = []
+        slots = asyncio.Semaphore(self.fetch_workers)
+        collecting = []
+        try:
+            position = 0
+            async for article in self._for_gatherer.iter_gather_links():
+                self._article_positions[article.link] = position
+                # Don't run further ahead of the gatherer than the workers.
+                await slots.acquire()
+                collecting.append(
+                    asyncio.ensure_future(
+                        self._collect_article(position, article, slots, chunks)
+                    )
+                )
+                position += 1
+            await asyncio.gather(*collecting)
+        finally:
+            for task in collecting:
+                task.cancel()
+
+        self._restore_article_order(chunks)
+        if self.result_store is not None:
+            await self._in_store(self.result_store.flush)
+        await self._in_store(self._create_normalized_link_list)
+
+    async def _request(self, task: LinkTask) -> CheckOutcome:
+        event = self.metrics.request_started("link_check", task.method, task.url)
+        try:
+            async with self._client().request(
+                task.method,
+                task.url,
+                headers=self.request_headers,
+                ssl=self.verify_ssl,
+                timeout=self.timeout,
+            ) as response:
+                # Don't download it: the connection is closed rather than
+                # reused, but a large file isn't a timeout.
+                response.release()
+        except Exception as ex:
+            # Whatever fails, e.g. idna rejecting the host name, fails this
+            # link only. Cancellation isn't an Exception and still stops it.
+            error = as_requests_exception(ex)
+            self.metrics.request_finished(event, exception=error)
+            return CheckOutcome(task.url, exception=error)
+        _request_finished(self.metrics, event, response, response.content_length)
+
+        hist = response.history
+        return CheckOutcome(
+            task.url,
+            hist[0].status if len(hist) > 0 else response.status,
+            urllib.parse.unquote(str(response.url)),
+            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+    async def _check(self, task: LinkTask, slots, finished):
+        try:
+            outcome = await self._request(task)
+        finally:
+            slots.release()
+
+        if outcome.status_code in RETRY_STATUS_CODES and self.scheduler.retry(
+            task, outcome.retry_after
+        ):
+            self.metrics.count("retries", "link_check")
+            if self.verbose:
+                print(f"{outcome.status_code} for {task}, requeued")
+            outcome = None
+        else:
+            self.scheduler.complete(task)
+        finished.put_nowait(outcome)
+
+    async def iter_outcomes(self, urls):
+        """Check `urls` and yield a CheckOutcome per URL in completion order."""
+        for url in urls:
+            self.scheduler.add(url)
+
+        slots = asyncio.Semaphore(self.scan_workers)
+        finished = asyncio.Queue()
+        checking = set()
+        try:
+            while not self.scheduler.finished or not finished.empty():
+                while not finished.empty():
+                    outcome = finished.get_nowait()
+                    if outcome is not None:
+                        yield outcome
+
+                task, wait = self.scheduler.next_ready()
+                if task is not None:
+                    await slots.acquire()
+                    check = asyncio.ensure_future(self._check(task, slots, finished))
+                    checking.add(check)
+                    check.add_done_callback(checking.discard)
+                    continue
+                if self.scheduler.finished:
+                    continue
+
+                # Nothing may start yet: wait for a completion or for a held
+                # back host to open up.
+                try:
+                    outcome = await asyncio.wait_for(finished.get(), wait)
+                except asyncio.TimeoutError:
+                    continue
+                if outcome is not None:
+                    yield outcome
+        finally:
+            for check in list(checking):
+                check.cancel()
+
+    async def iter_scan(self):
+        """
+            Check every normalized link and yield the ScanResults of a link as
+            soon as its request completes, in completion order. Links to
+            articles fetched by collect_links come first, without a request.
+        """
+        fetched, to_check = self._split_fetched()
+        try:
+            for outcome in fetched:
+                for scan_result in await self._in_store(self._apply_outcome, outcome):
+                    yield scan_result
+            async for outcome in self.iter_outcomes(to_check):
+                for scan_result in await self._in_store(self._apply_outcome, outcome):
+                    yield scan_result
+        finally:
+            await self._in_store(self._flush_results)
+
+    async def scan_links(self):
+        async for _ in self.iter_scan():
+            pass
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from http_headers import conditional_headers
+
+
+def content_hash(*parts) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class StoredArticle(object):
+    __slots__ = (
+        "url",
+        "etag",
+        "last_modified",
+        "body_hash",
+        "frame_hash",
+        "links",
+        "fetched_at",
+    )
+
+    def __init__(
+        self, url, etag, last_modified, body_hash, frame_hash, links, fetched_at
+    ):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.frame_hash = frame_hash
+        self.links = links
+        self.fetched_at = fetched_at
+
+    @property
+    def validators(self) -> dict:
+        return conditional_headers(self.etag, self.last_modified)
+
+
+class ArticleStore(object):
+    """
+        Remembers, per article URL, what the last crawl saw: the validators the
+        server sent, a hash of the raw body, a hash of the scan-level frames and
+        the links extracted from them.
+
+        The Scanner uses it to skip articles that did not change between runs:
+        a 304, an identical body or identical frames all mean the stored links
+        can be reused without running handle_frame again.
+
+        The hashes are salted with the scan levels in use, so changing the
+        levels invalidates what was stored for the old ones.
+    """
+
+    def __init__(self, path: str, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " body_hash TEXT NOT NULL,"
+            " frame_hash TEXT NOT NULL,"
+            " links TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL)"
+        )
+
+    def lookup(self, url: str) -> StoredArticle:
+        row = self._db.execute(
+            "SELECT url, etag, last_modified, body_hash, frame_hash, links, fetched_at"
+            " FROM articles WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        row = list(row)
+        row[5] = json.loads(row[5])
+        return StoredArticle(*row)
+
+    def store(
+        self,
+        url: str,
+        body_hash: str,
+        frame_hash: str,
+        links: list,
+        etag: str = None,
+        last_modified: str = None,
+    ):
+        self._db.execute(
+            "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                url,
+                etag,
+                last_modified,
+                body_hash,
+                frame_hash,
+                json.dumps(links),
+                self.clock(),
+            ),
+        )
+
+    def flush(self):
+        self._db.commit()
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
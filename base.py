@@ -1,4 +1,6 @@
 class PybLevel(object):
+    __slots__ = ("html_tag", "html_attrib", "html_attrib_val")
+
     def __init__(self, html_tag: str, html_attrib: str, html_attrib_val: str):
         self.html_tag = html_tag
         self.html_attrib = html_attrib
@@ -9,6 +11,8 @@ class PybLevel(object):
 
 
 class PybLink(object):
+    __slots__ = ("text", "link")
+
     def __init__(self, text: str, link: str):
         self.text = text
         self.link = link
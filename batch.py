@@ -0,0 +1,289 @@
+"""
+Audit many blogs in one run.
+
+    python batch.py sites.json --output reports/
+
+sites.json looks like
+
+    {
+        "connections": 64,
+        "check_mode": "head",
+        "error_retries": 2,
+        "adaptive_timeout": true,
+        "link_cache": "links.db",
+        "sites": [
+            {
+                "name": "clamytoe",
+                "root_page": "https://clamytoe.github.io/",
+                "gather_level": ["ul", "class", "uk-nav-side"],
+                "scan_levels": [
+                    ["section", "itemprop", "articleBody"],
+                    {"css": "main > article .entry-content"}
+                ],
+                "timeout": 5,
+                "verify_ssl": true
+            }
+        ]
+    }
+
+Only name, root_page, gather_level and scan_levels are required. A scan level
+is a list of ScanLevel's positional arguments or an object of its keyword
+arguments. Every site is gathered and collected concurrently, then the links
+of all sites are checked together so a URL linked from many blogs is requested
+once; sites with another timeout or SSL setting get a checker of their own. All
+requests share one connection pool and never more than `connections` are in
+flight at once. A JSON report per site is written to the output directory.
+"""
+import argparse
+import json
+import os
+from urllib.parse import urlparse
+
+import gevent
+
+from checker import LinkChecker
+from link_cache import LinkCache
+from pyblix import Gatherer, GatherLevel, Scanner, ScanLevel
+from sessions import SessionPool
+
+
+class SiteConfig(object):
+    __slots__ = (
+        "name",
+        "domain",
+        "root_page",
+        "gather_level",
+        "scan_levels",
+        "timeout",
+        "verify_ssl",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        root_page: str,
+        gather_level,
+        scan_levels,
+        domain: str = None,
+        timeout: int = 3,
+        verify_ssl: bool = True,
+    ):
+        self.name = name
+        self.domain = domain or urlparse(root_page).netloc
+        self.root_page = root_page
+        self.gather_level = GatherLevel(*gather_level)
+        self.scan_levels = [
+            ScanLevel(**level) if isinstance(level, dict) else ScanLevel(*level)
+            for level in scan_levels
+        ]
+        self.timeout = timeout
+        self.verify_ssl = verify_ssl
+
+    @classmethod
+    def from_dict(cls, entry: dict):
+        return cls(**entry)
+
+
+CHECK_OPTIONS = ("check_mode", "error_retries", "adaptive_timeout")
+
+
+def load_config(path: str):
+    """
+        Returns (options, [SiteConfig]) read from a JSON config file, options
+        being the BatchRun keyword arguments the file sets.
+    """
+    with open(path) as config_file:
+        config = json.load(config_file)
+    sites = [SiteConfig.from_dict(entry) for entry in config["sites"]]
+    keys = ("connections",) + CHECK_OPTIONS
+    options = {key: config[key] for key in keys if key in config}
+    if "link_cache" in config:
+        options["link_cache"] = LinkCache(config["link_cache"])
+    return options, sites
+
+
+class SiteRun(object):
+    __slots__ = ("site", "scanner", "error")
+
+    def __init__(self, site: SiteConfig):
+        self.site = site
+        self.scanner = None
+        self.error = None
+
+    def report(self) -> dict:
+        report = {
+            "site": self.site.name,
+            "root_page": self.site.root_page,
+            "error": None if self.error is None else repr(self.error),
+        }
+        if self.scanner is None:
+            return report
+
+        results = self.scanner.all_results
+        report.update(
+            articles=len(self.scanner.all_articles),
+            links=len(results),
+            unique_links=len(self.scanner.get_normalized_link_list),
+            broken=sum(r.threw_exception or r.status_code >= 400 for r in results),
+            redirected=sum(300 <= r.status_code < 400 for r in results),
+            results=[
+                {
+                    "article": r.parent_link,
+                    "link": r.scan_link,
+                    "status_code": r.status_code,
+                    "result": r.result_text,
+                }
+                for r in results
+            ],
+        )
+        return report
+
+
+class BatchRun(object):
+    """
+        Runs a Gatherer and Scanner per site on one shared, budgeted
+        SessionPool and checks the links of all sites with one LinkChecker per
+        SSL setting and timeout, so shared links are requested once. The
+        check options apply to every checker.
+    """
+
+    def __init__(
+        self,
+        sites: list,
+        connections: int = 64,
+        fetch_workers: int = 8,
+        verbose: bool = False,
+        check_mode: str = "get",
+        error_retries: int = 0,
+        adaptive_timeout: bool = False,
+        link_cache: LinkCache = None,
+    ):
+        self.sites = sites
+        self.connections = connections
+        self.fetch_workers = fetch_workers
+        self.verbose = verbose
+        self.check_mode = check_mode
+        self.error_retries = error_retries
+        self.adaptive_timeout = adaptive_timeout
+        self.link_cache = link_cache
+        self.sessions = SessionPool(pool_size=connections, budget=connections)
+        self.runs = [SiteRun(site) for site in sites]
+        # (verify_ssl, timeout) -> the LinkChecker of the sites sharing them
+        self.checkers = {}
+
+    def _checker_for(self, site: SiteConfig) -> LinkChecker:
+        key = (site.verify_ssl, site.timeout)
+        checker = self.checkers.get(key)
+        if checker is None:
+            checker = self.checkers[key] = LinkChecker(
+                verify_ssl=site.verify_ssl,
+                timeout=site.timeout,
+                workers=self.connections,
+                sessions=self.sessions,
+                check_mode=self.check_mode,
+                cache=self.link_cache,
+                verbose=self.verbose,
+                error_retries=self.error_retries,
+                adaptive_timeout=self.adaptive_timeout,
+            )
+        return checker
+
+    def _collect(self, run: SiteRun):
+        site = run.site
+        try:
+            gatherer = Gatherer(
+                site.domain,
+                site.verify_ssl,
+                site.root_page,
+                site.gather_level,
+                verbose=self.verbose,
+                sessions=self.sessions,
+            )
+            scanner = Scanner(
+                gatherer,
+                timeout=site.timeout,
+                fetch_workers=self.fetch_workers,
+                sessions=self.sessions,
+                checker=self._checker_for(site),
+            )
+            for scan_level in site.scan_levels:
+                scanner.add_level(scan_level)
+            scanner.collect_links()
+        except Exception as ex:
+            run.error = ex
+            if self.verbose:
+                print(f"{site.name}: {ex!r}")
+            return
+        run.scanner = scanner
+
+    def _check(self, runs: list, checker: LinkChecker, fetched_pages: dict):
+        # canonical url -> scanners that link to it
+        interested = {}
+        for run in runs:
+            for url in run.scanner.get_normalized_link_list:
+                outcome = fetched_pages.get(url)
+                if outcome is not None:
+                    run.scanner._apply_outcome(outcome)
+                else:
+                    interested.setdefault(url, []).append(run.scanner)
+        if self.verbose:
+            total = sum(len(run.scanner.get_normalized_link_list) for run in runs)
+            print(f"Checking {len(interested)} links shared by {total} site links")
+
+        for outcome in checker.iter_outcomes(list(interested)):
+            for scanner in interested[outcome.url]:
+                scanner._apply_outcome(outcome)
+
+    def run(self) -> list:
+        gevent.joinall([gevent.spawn(self._collect, run) for run in self.runs])
+
+        collected = [run for run in self.runs if run.scanner is not None]
+        # An article fetched for one site answers the links of every site.
+        fetched_pages = {}
+        for run in collected:
+            fetched_pages.update(run.scanner.fetched_pages)
+        for checker in self.checkers.values():
+            runs = [run for run in collected if run.scanner.checker is checker]
+            if runs:
+                self._check(runs, checker, fetched_pages)
+        return [run.report() for run in self.runs]
+
+
+def write_reports(reports: list, output_dir: str):
+    os.makedirs(output_dir, exist_ok=True)
+    for report in reports:
+        path = os.path.join(output_dir, f"{report['site']}.json")
+        with open(path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit many blogs in one run.")
+    parser.add_argument("config", help="JSON file listing the sites")
+    parser.add_argument("--output", default="reports", help="report directory")
+    parser.add_argument("--connections", type=int, help="overrides the config")
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    options, sites = load_config(args.config)
+    if args.connections:
+        options["connections"] = args.connections
+    batch = BatchRun(
+        sites, fetch_workers=args.fetch_workers, verbose=args.verbose, **options
+    )
+    reports = batch.run()
+    write_reports(reports, args.output)
+    for report in reports:
+        if report["error"] is not None:
+            print(f"{report['site']}: failed, {report['error']}")
+        else:
+            print(
+                f"{report['site']}: {report['articles']} articles,"
+                f" {report['links']} links, {report['broken']} broken,"
+                f" {report['redirected']} redirected"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+bench_memory.py
+
+Measures what one link occurrence costs while collecting links: the
+ScanResult as it used to be (a __dict__ per result, deepcopied from a
+per-article template for every anchor) against the slotted ScanResult
+built directly from the article's strings.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory
+"""
+import copy
+import time
+import tracemalloc
+
+from pyblix import GatherLink, ScanResult
+
+
+class LegacyScanResult(object):
+    # ScanResult before it got __slots__.
+    def __init__(self, parent_text, parent_link):
+        self.parent_text = parent_text
+        self.parent_link = parent_link
+
+        self.scan_link = ""
+
+        self.status_code = 0
+        self.threw_exception = False
+        self.result_text = ""
+        self.scan_done = False
+
+    def set_scan_link(self, link):
+        self.scan_link = link
+
+
+def legacy_occurrences(articles, links):
+    results = []
+    for article in articles:
+        template = LegacyScanResult(article.text, article.link)
+        for link in links:
+            result = copy.deepcopy(template)
+            result.set_scan_link(link)
+            results.append(result)
+    return results
+
+
+def slotted_occurrences(articles, links):
+    results = []
+    for article in articles:
+        template = ScanResult(article.text, article.link)
+        for link in links:
+            results.append(
+                ScanResult(template.parent_text, template.parent_link, link)
+            )
+    return results
+
+
+def measure(build, articles, links):
+    start = time.perf_counter()
+    count = len(build(articles, links))
+    elapsed = time.perf_counter() - start
+
+    # Separate run, tracemalloc slows allocation down a lot.
+    tracemalloc.start()
+    results = build(articles, links)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return count, allocated, elapsed
+
+
+def main(article_count=2_000, links_per_article=100):
+    articles = [
+        GatherLink(f"Article number {n}", f"https://blog.invalid/posts/{n}.html")
+        for n in range(article_count)
+    ]
+    # Link strings exist anyway (they come out of the parser), keep them
+    # outside the measurement.
+    links = [f"https://target.invalid/page/{n}" for n in range(links_per_article)]
+
+    print(f"{'record':>10} {'occurrences':>12} {'bytes each':>11} {'build (s)':>10}")
+    for name, build in [
+        ("legacy", legacy_occurrences),
+        ("slotted", slotted_occurrences),
+    ]:
+        count, allocated, elapsed = measure(build, articles, links)
+        print(f"{name:>10} {count:>12} {allocated / count:>11.1f} {elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+bench_parse_workers.py
+
+Times extracting the scan-level links from a batch of synthetic articles in
+process and in process pools of growing size, the work collect_links hands
+to its parse_workers.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parse_workers
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+from benchmarks.bench_parsers import synthetic_article
+from core import ScanLevel
+from parsers import extract_links, level_spec
+
+LEVELS = [level_spec(ScanLevel("article", "class", "single"))]
+
+
+def run(bodies, workers):
+    if workers == 0:
+        start = time.perf_counter()
+        parsed = [extract_links(body, LEVELS, encoding="utf-8") for body in bodies]
+        return parsed, time.perf_counter() - start
+
+    with concurrent.futures.ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        # Start the workers before timing, the Scanner keeps them for a crawl.
+        list(pool.map(abs, range(workers)))
+        start = time.perf_counter()
+        futures = [
+            pool.submit(extract_links, body, LEVELS, encoding="utf-8")
+            for body in bodies
+        ]
+        parsed = [future.result() for future in futures]
+        return parsed, time.perf_counter() - start
+
+
+def main(articles=16):
+    bodies = [synthetic_article(paragraphs=500).encode()] * articles
+    expected, baseline = run(bodies, 0)
+    print(f"{articles} articles, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+    print(f"{'-':>8} {baseline:>9.3f} {1.0:>8.2f}")
+    for workers in (1, 2, 4, 8):
+        parsed, took = run(bodies, workers)
+        assert parsed == expected
+        print(f"{workers:>8} {took:>9.3f} {baseline / took:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
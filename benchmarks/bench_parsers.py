@@ -0,0 +1,80 @@
+"""
+bench_parsers.py
+
+Times extracting the scan-level anchors from a large synthetic article with
+every available parser backend, once on the full tree and once on the tree
+limited to the scan levels.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parsers
+"""
+import time
+
+from bs4 import BeautifulSoup
+
+from parsers import HAVE_LXML, parse_levels
+from pyblix import ScanLevel
+
+LEVELS = [ScanLevel("article", "class", "single")]
+
+
+def synthetic_article(paragraphs=2_000, sidebar_items=3_000):
+    body = "".join(
+        f'<p>Paragraph {n} with <a href="https://example.com/{n}">a link</a>'
+        f" and <em>some</em> <strong>markup</strong>.</p>"
+        for n in range(paragraphs)
+    )
+    sidebar = "".join(
+        f'<li class="item"><a href="/tag/{n}">tag {n}</a><span>{n}</span></li>'
+        for n in range(sidebar_items)
+    )
+    return (
+        "<html><head><title>Synthetic</title></head><body>"
+        f"<nav><ul>{sidebar}</ul></nav>"
+        f'<article class="single">{body}</article>'
+        f"<footer><ul>{sidebar}</ul></footer>"
+        "</body></html>"
+    )
+
+
+def anchors(soup):
+    found = []
+    for level in LEVELS:
+        query = {level.html_attrib: level.html_attrib_val}
+        for frame in soup.find_all(level.html_tag, query):
+            found.extend(a["href"] for a in frame.find_all("a"))
+    return found
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(repeat=5):
+    markup = synthetic_article()
+    backends = ["html.parser"] + (["lxml"] if HAVE_LXML else [])
+    expected = None
+    print(f"article size: {len(markup) // 1024} KiB")
+    print(f"{'backend':>12} {'full tree (s)':>14} {'strained (s)':>13}")
+    for backend in backends:
+        full, full_anchors = best_of(
+            repeat, lambda: anchors(BeautifulSoup(markup, backend))
+        )
+        strained, strained_anchors = best_of(
+            repeat, lambda: anchors(parse_levels(markup, LEVELS, backend))
+        )
+        expected = expected or full_anchors
+        assert full_anchors == strained_anchors == expected
+        print(f"{backend:>12} {full:>14.3f} {strained:>13.3f}")
+    if not HAVE_LXML:
+        print("lxml is not installed, pip install lxml to compare it too.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+bench_result_index.py
+
+Compares matching responses to ScanResults with the URL index kept by the
+Scanner against the old list scan over every result.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_result_index
+"""
+import time
+import urllib.parse
+
+from checker import CheckOutcome
+from http_headers import FIREFOX_LINUX
+from pyblix import GatherLink, Scanner, ScanResult
+
+
+class SyntheticGatherer(object):
+    verbose = False
+    domain = "bench.invalid"
+    verify_ssl = False
+    request_headers = FIREFOX_LINUX
+
+    def __init__(self, articles):
+        self.gather_links = articles
+
+
+def build_scanner(occurrences, unique_links, links_per_article=50):
+    articles = [
+        GatherLink(f"Article {n}", f"https://bench.invalid/post/{n}")
+        for n in range(occurrences // links_per_article)
+    ]
+    scanner = Scanner(SyntheticGatherer(articles))
+    for n in range(occurrences):
+        article = articles[n // links_per_article]
+        scan_result = ScanResult(article.text, article.link)
+        scan_result.set_scan_link(f"https://target.invalid/page/{n % unique_links}")
+        scanner._record_result(scan_result)
+    return scanner
+
+
+def list_scan_match(scanner, outcome):
+    # What scan_links did before the index existed.
+    indices = [
+        i
+        for i, x in enumerate(scanner.all_results)
+        if x.scan_link == urllib.parse.unquote(outcome.url)
+    ]
+    for idx in indices:
+        scanner.all_results[idx].set_result_by_status_code(
+            outcome.status_code, urllib.parse.unquote(outcome.redirect_link)
+        )
+
+
+def time_per_outcome(match, outcomes):
+    start = time.perf_counter()
+    for outcome in outcomes:
+        match(outcome)
+    return (time.perf_counter() - start) / len(outcomes)
+
+
+def run(occurrences, unique_links, list_scan_sample=200):
+    scanner = build_scanner(occurrences, unique_links)
+    outcomes = []
+    for n in range(unique_links):
+        link = f"https://target.invalid/page/{n}"
+        outcomes.append(CheckOutcome(link, 200, link))
+
+    indexed = time_per_outcome(scanner._apply_outcome, outcomes)
+    # The list scan is far too slow to run for every outcome at the larger
+    # sizes, so it is timed on a sample and extrapolated.
+    scanned = time_per_outcome(
+        lambda o: list_scan_match(scanner, o), outcomes[:list_scan_sample]
+    )
+    return {
+        "occurrences": occurrences,
+        "unique_links": unique_links,
+        "indexed_total_s": indexed * unique_links,
+        "list_scan_total_s": scanned * unique_links,
+    }
+
+
+def main():
+    print(
+        f"{'occurrences':>12} {'unique':>8} {'indexed (s)':>12} {'list scan (s)':>14}"
+    )
+    for occurrences, unique_links in [
+        (1_000, 300),
+        (10_000, 3_000),
+        (100_000, 30_000),
+    ]:
+        row = run(occurrences, unique_links)
+        print(
+            f"{row['occurrences']:>12} {row['unique_links']:>8}"
+            f" {row['indexed_total_s']:>12.4f} {row['list_scan_total_s']:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+bench_result_store.py
+
+Peak Python memory of recording link occurrences in a Scanner, kept in
+memory against spilled to a ResultStore on disk, and the time to record them
+and stream them back.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_result_store
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_result_index import SyntheticGatherer
+from pyblix import GatherLink, Scanner, ScanResult
+from result_store import ResultStore
+
+
+# Blogs link to the same pages over and over, the unique URLs (which the
+# normalizer and the link checker keep in memory anyway) are far fewer than
+# the occurrences.
+UNIQUE_LINKS = 5_000
+
+
+def record(scanner, articles, links_per_article):
+    for position, article in enumerate(articles):
+        scanner._article_positions[article.link] = position
+        for n in range(links_per_article):
+            scanner._record_result(
+                ScanResult(
+                    article.text,
+                    article.link,
+                    f"https://target.invalid/page/{(position * 7 + n) % UNIQUE_LINKS}",
+                )
+            )
+
+
+def measure(articles, links_per_article, result_store=None):
+    tracemalloc.start()
+    start = time.perf_counter()
+    scanner = Scanner(SyntheticGatherer(articles), result_store=result_store)
+    record(scanner, articles, links_per_article)
+    if result_store is not None:
+        result_store.flush()
+    recorded = time.perf_counter() - start
+    streamed = sum(1 for _ in scanner.all_results)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return streamed, peak, recorded
+
+
+def main(article_count=1_000, links_per_article=100):
+    articles = [
+        GatherLink(f"Article number {n}", f"https://blog.invalid/posts/{n}.html")
+        for n in range(article_count)
+    ]
+    print(f"{'storage':>8} {'occurrences':>12} {'peak (MiB)':>11} {'record (s)':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, store in [
+            ("memory", None),
+            ("sqlite", ResultStore(os.path.join(directory, "results.db"))),
+        ]:
+            count, peak, recorded = measure(articles, links_per_article, store)
+            print(f"{name:>8} {count:>12} {peak / 2 ** 20:>11.1f} {recorded:>11.2f}")
+            if store is not None:
+                store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+bench_suite.py
+
+End to end benchmark against the synthetic blog in synthetic_site.py, served
+from a separate process on localhost so no network is involved. Times the
+Gatherer, collect_links and the link scan separately and reports, per phase,
+throughput, p50/p99 request latency and the peak RSS so far.
+
+Run from the repository root, optionally saving the numbers to compare runs
+across commits:
+
+    python -m benchmarks.bench_suite --articles 200 --links 25 --output run.json
+"""
+import argparse
+import json
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+from pyblix import Gatherer, GatherLevel, Scanner, ScanLevel
+from sessions import SessionPool
+
+
+def wait_for_server(address, deadline=10.0):
+    give_up = time.monotonic() + deadline
+    while time.monotonic() < give_up:
+        try:
+            socket.create_connection(address, timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"synthetic site did not come up on {address}")
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_kib():
+    # ru_maxrss is in KiB on Linux but in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class LatencyRecorder(object):
+    """Response hook collecting the time to headers of every response."""
+
+    def __init__(self):
+        self.latencies = []
+
+    def __call__(self, response, *args, **kwargs):
+        self.latencies.append(response.elapsed.total_seconds())
+
+    def take(self):
+        latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def phase_report(seconds, items, latencies):
+    return {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "throughput": round(items / seconds, 2) if seconds else None,
+        "requests": len(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    root = f"http://127.0.0.1:{args.port}"
+    sessions = SessionPool(max(args.fetch_workers, args.scan_workers))
+    recorder = LatencyRecorder()
+    sessions.for_url(root).hooks["response"].append(recorder)
+    phases = {}
+
+    start = time.perf_counter()
+    gatherer = Gatherer(
+        f"127.0.0.1:{args.port}",
+        False,
+        f"{root}/index.html",
+        GatherLevel("ul", "id", "articleList"),
+        sessions=sessions,
+    )
+    phases["gather"] = phase_report(
+        time.perf_counter() - start, gatherer.number_of_gather_links, recorder.take()
+    )
+
+    scanner = Scanner(
+        gatherer,
+        timeout=args.timeout,
+        fetch_workers=args.fetch_workers,
+        sessions=sessions,
+        scan_workers=args.scan_workers,
+        check_mode=args.check_mode,
+        parse_workers=args.parse_workers,
+    )
+    scanner.add_level(ScanLevel("article", "class", "single"))
+    start = time.perf_counter()
+    scanner.collect_links()
+    phases["collect"] = phase_report(
+        time.perf_counter() - start, len(scanner.all_articles), recorder.take()
+    )
+
+    start = time.perf_counter()
+    for _ in scanner.iter_scan():
+        pass
+    phases["scan"] = phase_report(
+        time.perf_counter() - start,
+        len(scanner.get_normalized_link_list),
+        recorder.take(),
+    )
+    return {
+        "revision": git_revision(),
+        "config": vars(args),
+        "phases": phases,
+        "scan_results": len(scanner.all_results),
+        "check_stats": str(scanner.checker.stats),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--links", type=int, default=25)
+    parser.add_argument("--unique-links", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--scan-workers", type=int, default=16)
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--check-mode", choices=("get", "head"), default="get")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    site_args = [
+        f"--articles={args.articles}",
+        f"--links={args.links}",
+        f"--seed={args.seed}",
+        f"--port={args.port}",
+    ]
+    if args.unique_links:
+        site_args.append(f"--unique-links={args.unique_links}")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.synthetic_site", *site_args]
+    )
+    try:
+        wait_for_server(("127.0.0.1", args.port))
+        report = run(args)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'phase':>8} {'seconds':>9} {'items/s':>9} {'p50 (s)':>8} "
+          f"{'p99 (s)':>8} {'peak RSS (KiB)':>15}")
+    for name, phase in report["phases"].items():
+        p50 = "-" if phase["p50"] is None else f"{phase['p50']:.4f}"
+        p99 = "-" if phase["p99"] is None else f"{phase['p99']:.4f}"
+        print(
+            f"{name:>8} {phase['seconds']:>9.3f} {phase['throughput'] or 0:>9.1f} "
+            f"{p50:>8} {p99:>8} {phase['peak_rss_kib']:>15}"
+        )
+    print(report["check_stats"])
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+synthetic_site.py
+
+A synthetic blog for the benchmarks, generated on the fly from a seed so
+every run sees the same site: an index listing `articles` posts, each post
+linking to `links` targets drawn from TARGET_MIX.
+
+Run it on its own to have a look:
+
+    python -m benchmarks.synthetic_site --articles 50 --links 20 --port 9100
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# (target kind, weight). "moved" redirects to "ok", "limited" answers 429 the
+# first time it is asked, "slow" takes SLOW_SECONDS and "timeout" takes longer
+# than any sane check timeout.
+TARGET_MIX = (
+    ("ok", 70),
+    ("moved", 10),
+    ("missing", 10),
+    ("slow", 5),
+    ("limited", 4),
+    ("timeout", 1),
+)
+SLOW_SECONDS = 0.2
+TIMEOUT_SECONDS = 5.0
+
+
+class SyntheticSite(object):
+    def __init__(self, base_url, articles=200, links=25, unique_links=None, seed=0):
+        self.base_url = base_url
+        self.articles = articles
+        self.links = links
+        # Real blogs link to the same pages over and over.
+        self.unique_links = unique_links or max(1, articles * links // 4)
+        self.seed = seed
+
+        kinds = [kind for kind, _ in TARGET_MIX]
+        weights = [weight for _, weight in TARGET_MIX]
+        rng = random.Random(seed)
+        self.targets = [
+            f"{base_url}/{kind}/{n}"
+            for n, kind in enumerate(rng.choices(kinds, weights, k=self.unique_links))
+        ]
+
+    def index(self) -> str:
+        items = "".join(
+            f'<li><a href="/post/{n}.html">Post {n}</a></li>'
+            for n in range(self.articles)
+        )
+        return (
+            "<html><head><title>Synthetic blog</title></head><body>"
+            f'<ul id="articleList">{items}</ul>'
+            '<div id="sidebar"><a href="/about.html">About</a></div>'
+            "</body></html>"
+        )
+
+    def article_targets(self, n: int) -> list:
+        rng = random.Random(f"{self.seed}/{n}")
+        return [rng.choice(self.targets) for _ in range(self.links)]
+
+    def article(self, n: int) -> str:
+        paragraphs = "".join(
+            f'<p>Paragraph {i} points at <a href="{target}">{target}</a>.</p>'
+            for i, target in enumerate(self.article_targets(n))
+        )
+        return (
+            f"<html><head><title>Post {n}</title></head><body>"
+            '<nav><a href="/index.html">Home</a></nav>'
+            f'<article class="single">{paragraphs}</article>'
+            "</body></html>"
+        )
+
+
+class SyntheticHandler(BaseHTTPRequestHandler):
+    site = None
+    protocol_version = "HTTP/1.1"
+    limited_hits = set()
+    _lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def page(self) -> bytes:
+        path = self.path.split("?", 1)[0]
+        if path == "/index.html":
+            return self.site.index().encode()
+        if path.startswith("/post/") and path.endswith(".html"):
+            n = path[len("/post/") : -len(".html")]
+            if n.isdigit() and int(n) < self.site.articles:
+                return self.site.article(int(n)).encode()
+        return None
+
+    def do_GET(self):
+        body = self.page()
+        if body is not None:
+            return self.respond(200, body)
+
+        kind, _, _ = self.path.lstrip("/").partition("/")
+        if kind == "ok":
+            self.respond(200, b"<html><body>ok</body></html>")
+        elif kind == "moved":
+            location = self.site.base_url + self.path.replace("/moved/", "/ok/")
+            self.respond(301, headers=[("Location", location)])
+        elif kind == "slow":
+            time.sleep(SLOW_SECONDS)
+            self.respond(200, b"<html><body>slow</body></html>")
+        elif kind == "timeout":
+            time.sleep(TIMEOUT_SECONDS)
+            self.respond(200, b"<html><body>late</body></html>")
+        elif kind == "limited":
+            with self._lock:
+                first_hit = self.path not in self.limited_hits
+                self.limited_hits.add(self.path)
+            if first_hit:
+                self.respond(429, headers=[("Retry-After", "0")])
+            else:
+                self.respond(200, b"<html><body>limited</body></html>")
+        else:
+            self.respond(404, b"<html><body>not found</body></html>")
+
+    do_HEAD = do_GET
+
+
+def serve(site: SyntheticSite, port: int, host: str = "127.0.0.1"):
+    handler = type("Handler", (SyntheticHandler,), {"site": site})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--links", type=int, default=25)
+    parser.add_argument("--unique-links", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args(argv)
+
+    site = SyntheticSite(
+        f"http://127.0.0.1:{args.port}",
+        args.articles,
+        args.links,
+        args.unique_links,
+        args.seed,
+    )
+    serve(site, args.port).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
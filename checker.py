@@ -0,0 +1,394 @@
+import urllib.parse
+
+import gevent
+import gevent.event
+import grequests
+import requests
+
+from core import CheckOutcome
+from dns_cache import DNSCache
+from exceptions import HostShortCircuitedException
+from http_headers import FIREFOX_LINUX
+from metrics import Metrics
+from scheduler import (
+    RETRY_STATUS_CODES,
+    HostCircuitBreaker,
+    HostLatency,
+    HostScheduler,
+    LinkTask,
+)
+from sessions import SessionPool, imap_requests
+
+
+class LinkRequest(grequests.AsyncRequest):
+    def __init__(
+        self, task: LinkTask, event=None, precheck=None, hedge_after=None, **kwargs
+    ):
+        super(LinkRequest, self).__init__(task.method, task.url, **kwargs)
+        self.task = task
+        self.event = event
+        self.precheck = precheck
+        self.hedge_after = hedge_after
+        self.hedged = False
+        self.hedge_won = False
+
+    def send(self, **kwargs):
+        # The precheck runs in the worker, right before the request would go
+        # out, and fails the request without touching the network.
+        if self.precheck is not None:
+            try:
+                self.precheck(self.task)
+            except Exception as ex:
+                self.exception = ex
+                self.traceback = None
+                return self
+        if self.hedge_after is not None:
+            return self._send_hedged(**kwargs)
+        return super(LinkRequest, self).send(**kwargs)
+
+    def _send_hedged(self, **kwargs):
+        """
+            Send the request and, when it hasn't been answered after
+            `hedge_after` seconds, the same request again. The first response
+            wins and the other attempt is dropped. Only for GET and HEAD,
+            which can safely be sent twice.
+        """
+        merged_kwargs = dict(self.kwargs, **kwargs)
+
+        def attempt():
+            # Returned rather than raised, gevent would print it otherwise.
+            try:
+                return self.session.request(self.method, self.url, **merged_kwargs)
+            except Exception as ex:
+                return ex
+
+        attempts = [gevent.spawn(attempt)]
+        if not gevent.wait(attempts, timeout=self.hedge_after):
+            self.hedged = True
+            attempts.append(gevent.spawn(attempt))
+
+        winner = None
+        for finished in gevent.iwait(attempts):
+            if isinstance(finished.value, requests.Response):
+                winner = finished
+                break
+        losers = [other for other in attempts if other is not winner]
+        gevent.killall(losers)
+        for loser in losers:
+            if isinstance(loser.value, requests.Response):
+                loser.value.close()
+
+        if winner is None:
+            self.exception = attempts[0].value
+            self.traceback = None
+        else:
+            self.response = winner.value
+            self.hedge_won = winner is not attempts[0]
+        return self
+
+
+class CheckStats(object):
+    """Counters for one LinkChecker run."""
+
+    def __init__(self):
+        self.requests = 0
+        self.head_requests = 0
+        self.get_fallbacks = 0
+        self.bytes_saved = 0
+        self.cache_hits = 0
+        self.revalidated = 0
+        self.short_circuited = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def __str__(self):
+        return (
+            f"{self.requests} requests, {self.head_requests} HEAD,"
+            f" {self.get_fallbacks} GET fallbacks, {self.bytes_saved} bytes saved,"
+            f" {self.cache_hits} cache hits, {self.revalidated} revalidated,"
+            f" {self.short_circuited} short-circuited, {self.retries} retries,"
+            f" {self.hedged} hedged ({self.hedge_wins} won by the hedge)"
+        )
+
+
+class LinkChecker(object):
+    """
+        Checks a list of URLs concurrently and yields a CheckOutcome for each one
+        in completion order.
+
+        Requests are released by a HostScheduler, which keeps every host within
+        its concurrency and rate limits and requeues links answered with
+        429/503 instead of reporting them as broken right away.
+
+        With check_mode="head" a link is first checked with HEAD. When that
+        comes back with an error (405/501 or anything else >= 400, which some
+        servers only answer to HEAD) the link is checked again with a streamed
+        GET that is closed as soon as the headers are in. Either way the body
+        is never downloaded, `stats.bytes_saved` adds up what it would have
+        cost according to Content-Length.
+
+        Given a LinkCache, fresh entries are answered without a request and
+        stale entries with validators are revalidated conditionally.
+
+        Hosts are resolved once through a DNSCache before their first request,
+        and their connections are opened to the addresses it holds.
+        A host that doesn't resolve, or that fails to connect
+        `breaker_threshold` times in a row, has its circuit opened: its
+        remaining links fail at once with HostShortCircuitedException instead
+        of each waiting for the timeout. breaker_threshold=None turns this off.
+
+        Every host's response times are kept in a HostLatency. With
+        adaptive_timeout=True a link's first attempt gets a timeout sized
+        after its host's p99 latency (never above `timeout`), so a stalled
+        request to a fast host doesn't hold a worker for the full timeout.
+        Links that time out or fail to connect are tried again up to
+        `error_retries` times, after a jittered exponential backoff and with
+        the full `timeout`. With hedge=True a request still unanswered after
+        its host's p95 latency is sent a second time and the first response
+        wins. Retries and hedges are counted in `stats`.
+    """
+
+    def __init__(
+        self,
+        headers: dict = FIREFOX_LINUX,
+        verify_ssl: bool = True,
+        timeout: int = 3,
+        workers: int = None,
+        sessions: SessionPool = None,
+        scheduler: HostScheduler = None,
+        check_mode: str = "get",
+        cache=None,
+        verbose: bool = False,
+        metrics: Metrics = None,
+        dns_cache: DNSCache = None,
+        breaker_threshold: int = 3,
+        error_retries: int = 0,
+        adaptive_timeout: bool = False,
+        hedge: bool = False,
+        latency: HostLatency = None,
+    ):
+        self.headers = headers
+        self.verify_ssl = verify_ssl
+        self.timeout = timeout
+        self.workers = workers
+        if sessions is None:
+            sessions = SessionPool(dns_cache=dns_cache)
+        self.sessions = sessions
+        if scheduler is None:
+            scheduler = HostScheduler(jitter=0.5)
+        self.scheduler = scheduler
+        if check_mode not in ("get", "head"):
+            raise ValueError(f"Unknown check_mode {check_mode!r}")
+        self.check_mode = check_mode
+        self.cache = cache
+        self.verbose = verbose
+        self.stats = CheckStats()
+        self.metrics = metrics if metrics is not None else Metrics()
+        # The cache the connections read, so the precheck's lookup is the only one.
+        self.dns_cache = dns_cache if dns_cache is not None else sessions.dns_cache
+        self.breaker = None
+        if breaker_threshold is not None:
+            self.breaker = HostCircuitBreaker(breaker_threshold)
+        self.error_retries = error_retries
+        self.adaptive_timeout = adaptive_timeout
+        self.hedge = hedge
+        self.latency = latency if latency is not None else HostLatency()
+
+        # url -> stale cache entry we sent a conditional request for
+        self._revalidating = {}
+
+        self._completed = gevent.event.Event()
+
+    def build_request(self, task: LinkTask):
+        if task.method == "HEAD":
+            # requests doesn't follow redirects for HEAD unless told to.
+            options = {"allow_redirects": True}
+        else:
+            options = {"stream": self.check_mode == "head"}
+
+        headers = self.headers
+        entry = self._revalidating.get(task.url)
+        if entry is not None:
+            headers = dict(headers, **entry.validators)
+
+        timeout = self.timeout
+        if self.adaptive_timeout and task.attempt == 0:
+            # A retry may be a host that is slow for a while, not a blip.
+            timeout = self.latency.timeout(task.host, self.timeout)
+        hedge_after = None
+        if self.hedge:
+            hedge_after = self.latency.percentile(task.host, 0.95)
+        return LinkRequest(
+            task,
+            event=self.metrics.request_started("link_check", task.method, task.url),
+            precheck=self._precheck if self.breaker is not None else None,
+            hedge_after=hedge_after,
+            headers=headers,
+            verify=self.verify_ssl,
+            timeout=timeout,
+            session=self.sessions.for_url(task.url),
+            **options,
+        )
+
+    def request_iterator(self, urls):
+        """
+            Yields requests in the order and at the pace the scheduler allows.
+            Completions have to be reported back, which iter_outcomes does.
+        """
+        method = "HEAD" if self.check_mode == "head" else "GET"
+        for url in urls:
+            self.scheduler.add(url, method)
+
+        while not self.scheduler.finished:
+            task, wait = self.scheduler.next_ready()
+            if task is not None:
+                yield self.build_request(task)
+            else:
+                self._completed.wait(timeout=wait)
+                self._completed.clear()
+
+    def _precheck(self, task: LinkTask):
+        opened_by = self.breaker.opened_by(task.host)
+        if opened_by is not None:
+            raise HostShortCircuitedException(task.host, opened_by)
+
+        try:
+            hostname = urllib.parse.urlsplit(task.url).hostname
+        except ValueError:
+            # Left to requests, which fails it as an InvalidURL.
+            return
+        if not hostname:
+            return
+        try:
+            self.dns_cache.resolve(hostname)
+        except requests.exceptions.InvalidURL:
+            raise
+        except OSError as ex:
+            error = requests.exceptions.ConnectionError(
+                f"Failed to resolve {hostname}: {ex}"
+            )
+            # A name that doesn't resolve won't for the next link either.
+            self.breaker.trip(task.host, error)
+            raise error
+
+    def _update_breaker(self, task: LinkTask, exception):
+        if exception is None:
+            self.breaker.record_success(task.host)
+        elif isinstance(
+            exception, requests.exceptions.ConnectionError
+        ) and not isinstance(exception, requests.exceptions.SSLError):
+            # Connection refused/reset, connect timeouts and resolve errors;
+            # a bad certificate or a slow read still means someone answered.
+            self.breaker.record_failure(task.host, exception)
+
+    def _is_transient(self, task: LinkTask, exception) -> bool:
+        if self.breaker is not None and self.breaker.opened_by(task.host):
+            return False
+        return isinstance(
+            exception,
+            (requests.exceptions.Timeout, requests.exceptions.ConnectionError),
+        ) and not isinstance(exception, requests.exceptions.SSLError)
+
+    def _finish(self, request: LinkRequest):
+        # grequests only sets .exception when the request failed.
+        self.metrics.request_finished(
+            request.event, request.response, getattr(request, "exception", None)
+        )
+        task = request.task
+        if request.response is not None:
+            self.latency.observe(task.host, request.response.elapsed.total_seconds())
+        if request.hedged:
+            self.stats.hedged += 1
+            self.stats.hedge_wins += request.hedge_won
+            self.metrics.count("hedges", "link_check")
+        outcome = CheckOutcome.from_request(request)
+        if isinstance(outcome.exception, HostShortCircuitedException):
+            self.stats.short_circuited += 1
+            self.metrics.count("short_circuited", "link_check")
+        else:
+            self.stats.requests += 1
+            if task.method == "HEAD":
+                self.stats.head_requests += 1
+            if self.breaker is not None:
+                self._update_breaker(task, outcome.exception)
+
+        if outcome.status_code in RETRY_STATUS_CODES and self.scheduler.retry(
+            task, outcome.retry_after
+        ):
+            self.stats.retries += 1
+            self.metrics.count("retries", "link_check")
+            if self.verbose:
+                print(f"{outcome.status_code} for {task}, requeued")
+            outcome = None
+        elif (
+            task.attempt < self.error_retries
+            and self._is_transient(task, outcome.exception)
+            and self.scheduler.retry(task, hold_host=False)
+        ):
+            self.stats.retries += 1
+            self.metrics.count("retries", "link_check")
+            if self.verbose:
+                print(f"{type(outcome.exception).__name__} for {task}, requeued")
+            outcome = None
+        elif task.method == "HEAD" and outcome.status_code >= 400:
+            if self.verbose:
+                print(f"{outcome.status_code} for {task}, confirming with GET")
+            task.method = "GET"
+            self.scheduler.requeue(task)
+            self.stats.get_fallbacks += 1
+            outcome = None
+        else:
+            self.scheduler.complete(task)
+            if self.check_mode == "head" and outcome.content_length:
+                self.stats.bytes_saved += outcome.content_length
+            if self.cache is not None:
+                outcome = self._update_cache(outcome)
+        self._completed.set()
+        return outcome
+
+    def _update_cache(self, outcome: CheckOutcome) -> CheckOutcome:
+        entry = self._revalidating.pop(outcome.url, None)
+        if entry is not None and outcome.status_code == 304:
+            self.cache.refresh(entry)
+            self.stats.revalidated += 1
+            return CheckOutcome.from_cache_entry(entry)
+
+        if outcome.exception is None:
+            self.cache.store(
+                outcome.url,
+                outcome.status_code,
+                outcome.redirect_link,
+                outcome.etag,
+                outcome.last_modified,
+            )
+        return outcome
+
+    def _split_cached(self, urls):
+        cached, to_check = [], []
+        for url in urls:
+            entry = self.cache.lookup(url)
+            if entry is not None and self.cache.is_fresh(entry):
+                cached.append(CheckOutcome.from_cache_entry(entry))
+                continue
+            if entry is not None and entry.validators:
+                self._revalidating[url] = entry
+            to_check.append(url)
+        return cached, to_check
+
+    def iter_outcomes(self, urls):
+        self.stats = CheckStats()
+        if self.cache is not None:
+            cached, urls = self._split_cached(urls)
+            self.stats.cache_hits = len(cached)
+            yield from cached
+
+        outcomes = imap_requests(
+            self.request_iterator(urls), size=self.workers, finish=self._finish
+        )
+        for outcome in self.metrics.timed("link_check", outcomes):
+            if outcome is not None:
+                yield outcome
+
+        if self.cache is not None:
+            self.cache.flush()
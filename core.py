@@ -0,0 +1,668 @@
+"""
+The crawl model shared by the gevent API in pyblix.py and the asyncio API in
+aio.py: levels, links, results, and the bookkeeping of gatherers and scanners
+that doesn't depend on how requests are sent. Nothing here imports gevent.
+"""
+import urllib.parse
+
+import requests
+
+from base import PybActivity, PybLevel, PybLink
+from exceptions import (
+    DuplicateLevelException,
+    HostShortCircuitedException,
+    InvalidLinkEntryException,
+    UnknownDictExceptionError,
+)
+from http_headers import FIREFOX_LINUX
+from normalizer import LinkNormalizer
+from parsers import join_href, level_spec, resolve_backend
+from result_store import ResultStore
+from scheduler import host_of, parse_retry_after
+
+
+class GatherLink(PybLink):
+    __slots__ = ()
+
+    def __init__(self, text, link):
+        super(GatherLink, self).__init__(text, link)
+
+
+class GatherLevel(PybLevel):
+    __slots__ = ()
+
+    def __init__(self, html_tag: str, html_attrib: str, html_attrib_val: str):
+        super(GatherLevel, self).__init__(html_tag, html_attrib, html_attrib_val)
+
+
+class NextPageLevel(PybLevel):
+    """
+        Pagination rule: the element on an index page that links to the next
+        index page, <a rel="next"> unless told otherwise.
+    """
+
+    __slots__ = ()
+
+    def __init__(
+        self, html_tag: str = "a", html_attrib: str = "rel", html_attrib_val="next"
+    ):
+        super(NextPageLevel, self).__init__(html_tag, html_attrib, html_attrib_val)
+
+
+class PageTemplate(object):
+    """
+        Pagination rule for numbered index pages. PageTemplate("{root}page/{page}/")
+        walks /page/2/, /page/3/, ... below every root page. Without a
+        `last_page` pages are requested until one of them doesn't answer 200.
+    """
+
+    __slots__ = ("template", "first_page", "last_page")
+
+    def __init__(self, template: str, first_page: int = 2, last_page: int = None):
+        self.template = template
+        self.first_page = first_page
+        self.last_page = last_page
+
+    def pages(self, root: str):
+        page = self.first_page
+        while self.last_page is None or page <= self.last_page:
+            yield self.template.format(root=root, page=page)
+            page += 1
+
+
+class GatherBase(PybActivity):
+    """
+        What the Gatherer, AsyncGatherer and SitemapGatherer share: the
+        configuration, the gathered articles and reading index pages. Fetching
+        is up to them. A gatherer without an HTML index, like the sitemap one,
+        has no parent_level.
+    """
+
+    request_headers = FIREFOX_LINUX
+
+    def __init__(
+        self,
+        domain: str,
+        verify_ssl: bool,
+        article_root_page: str,
+        parent_level: GatherLevel,
+        verbose: bool = False,
+        parser: str = "html.parser",
+        root_pages: list = None,
+        pagination=None,
+        index_workers: int = 4,
+    ):
+        super(GatherBase, self).__init__(verbose, domain, verify_ssl)
+        self.article_root_page = article_root_page
+        self.identifiable_parent_level = parent_level
+        self.parser = resolve_backend(parser)
+        self.root_pages = [article_root_page] + [
+            page for page in root_pages or [] if page != article_root_page
+        ]
+        self.pagination = pagination
+        self.index_workers = index_workers
+
+        self._index_levels = [parent_level] if parent_level is not None else []
+        if isinstance(pagination, NextPageLevel):
+            self._index_levels.append(pagination)
+
+        self.gather_links = []
+        self._seen_links = set()
+        self._gathered = False
+
+    def iter_gather_links(self):
+        """
+            Yield every article as soon as the page listing it comes in. The
+            first call does the gathering, later calls replay gather_links.
+        """
+        if self._gathered:
+            yield from self.gather_links
+            return
+        yield from self.metrics.timed("index_fetch", self._gather())
+
+    def _gather(self):
+        raise NotImplementedError
+
+    def _find_parent_level(self, soup):
+        html_attrib = self.identifiable_parent_level.html_attrib
+        html_attrib_val = self.identifiable_parent_level.html_attrib_val
+        return soup.find(
+            self.identifiable_parent_level.html_tag, {html_attrib: html_attrib_val},
+        )
+
+    def _add_gather_links(self, anchors, page_url: str) -> list:
+        new_links = []
+        for anchor in anchors:
+            href = anchor.get("href")
+            if not href:
+                continue
+            glink = self._add_gather_link(anchor.text, join_href(page_url, href))
+            if glink is not None:
+                new_links.append(glink)
+        return new_links
+
+    def _add_gather_link(self, text: str, link: str):
+        """The new GatherLink, or None when `link` was gathered already."""
+        if link in self._seen_links:
+            return None
+        self._seen_links.add(link)
+        glink = GatherLink(text, link)
+        self.gather_links.append(glink)
+        return glink
+
+    def _next_page(self, soup, page_url: str):
+        if not isinstance(self.pagination, NextPageLevel):
+            return None
+        element = soup.find(
+            self.pagination.html_tag,
+            {self.pagination.html_attrib: self.pagination.html_attrib_val},
+        )
+        if element is not None and not element.get("href"):
+            element = element.find("a")
+        if element is None or not element.get("href"):
+            return None
+        try:
+            return urllib.parse.urljoin(page_url, element["href"])
+        except ValueError:
+            # Nothing to follow, keep the pages gathered so far.
+            return None
+
+    @property
+    def number_of_gather_links(self):
+        return len(self.gather_links)
+
+
+class ScanLevel(PybLevel):
+    """
+        A part of the article whose links are scanned: the elements with tag
+        `html_tag` whose `html_attrib` is `html_attrib_val` and which have
+        every attribute in `attrs` too. Leave the tag or the attribute out to
+        match any. Or match with a CSS selector instead:
+
+            ScanLevel("div", attrs={"class": "post", "itemprop": "articleBody"})
+            ScanLevel(css="main > article .entry-content")
+    """
+
+    __slots__ = ("attrs", "css")
+
+    def __init__(
+        self,
+        html_tag: str = None,
+        html_attrib: str = None,
+        html_attrib_val: str = None,
+        attrs: dict = None,
+        css: str = None,
+    ):
+        super(ScanLevel, self).__init__(html_tag, html_attrib, html_attrib_val)
+        self.attrs = dict(attrs or {})
+        self.css = css
+
+    @property
+    def spec(self) -> tuple:
+        """What the level matches as plain data, see parsers.level_spec."""
+        if self.css is not None:
+            return None, (), self.css
+        attrs = dict(self.attrs)
+        if self.html_attrib is not None:
+            attrs[self.html_attrib] = self.html_attrib_val
+        return self.html_tag, tuple(sorted(attrs.items())), None
+
+    def __str__(self):
+        if self.css is not None:
+            return f"<{self.css}>"
+        if self.attrs:
+            return f"<{self.html_tag} {self.spec[1]}>"
+        return super(ScanLevel, self).__str__()
+
+
+EXCEPTION_READABLE = {
+    requests.exceptions.SSLError: "ERR: SSL Error",
+    # TODO: Maybe find a way to clean these up? re?
+    requests.exceptions.InvalidURL: "ERR: URL Invalid",
+    requests.exceptions.ConnectionError: "ERR: Couldn't connect",
+    TypeError: "ERR: Unreadable response",  # Lol wth
+    requests.exceptions.ConnectTimeout: "ERR: Timed out",
+    requests.exceptions.ReadTimeout: "ERR: Read timed out",
+    HostShortCircuitedException: "ERR: Couldn't connect (host down, not requested)",
+}
+
+STATUS_READABLE = {
+    200: "OK: All Good!",
+    201: "OK: API Created response (?)",
+    202: "OK: Accepted",
+    301: "WRN: Moved permanently to {}",
+    302: "WRN: Redirected to {}",
+    400: "ERR: Bad Request",
+    401: "ERR: Unauthorized",
+    403: "ERR: Forbidden",
+    404: "ERR: Not Found",
+    405: "ERR: Get not allowed (?)",
+    406: "ERR: Unacceptable request",
+    429: "CRIT: Too many requests you filthy animal",
+    500: "ERR: Internal Server Error",
+    502: "ERR: Bad Gateway",
+    503: "ERR: Service Unavailable",
+}
+
+
+class ScanResult(object):
+    """
+        One occurrence of a link in an article. There is one of these per
+        anchor found, so it is kept small: no __dict__, and parent_text and
+        parent_link are the article's own strings rather than copies.
+    """
+
+    __slots__ = (
+        "parent_text",
+        "parent_link",
+        "scan_link",
+        "status_code",
+        "threw_exception",
+        "result_text",
+        "scan_done",
+    )
+
+    def __init__(self, parent_text, parent_link, scan_link=""):
+        self.parent_text = parent_text
+        self.parent_link = parent_link
+
+        self.scan_link = scan_link
+
+        self.status_code = 0
+        self.threw_exception = False
+        self.result_text = ""
+        self.scan_done = False
+
+    def set_scan_link(self, link):
+        self.scan_link = link
+
+    def set_result_by_exception(self, excep):
+        # Response object will be none so we need to add it to dict here
+        try:
+            self.threw_exception = True
+            self.result_text = EXCEPTION_READABLE[type(excep)]
+            self.scan_done = True
+        except KeyError as ex:
+            print(ex)
+            raise UnknownDictExceptionError
+
+    def set_result_by_status_code(self, status_code, redir_link=""):
+        self.status_code = status_code
+        self.result_text = STATUS_READABLE[status_code].format(redir_link)
+        self.scan_done = True
+
+
+class CheckOutcome(object):
+    """
+        What checking a single URL produced, detached from the Response so the
+        body can be released as soon as the request completes.
+    """
+
+    __slots__ = (
+        "url",
+        "status_code",
+        "redirect_link",
+        "exception",
+        "retry_after",
+        "content_length",
+        "etag",
+        "last_modified",
+    )
+
+    def __init__(
+        self,
+        url: str,
+        status_code: int = 0,
+        redirect_link: str = "",
+        exception=None,
+        retry_after: float = None,
+        content_length: int = None,
+        etag: str = None,
+        last_modified: str = None,
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.redirect_link = redirect_link
+        self.exception = exception
+        self.retry_after = retry_after
+        self.content_length = content_length
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @classmethod
+    def from_request(cls, request):
+        response = request.response
+        if response is None:
+            return cls(request.url, exception=request.exception)
+
+        try:
+            redirect_link = urllib.parse.unquote(response.url)
+            hist = response.history
+            if len(hist) > 0:
+                status_code = hist[0].status_code
+            else:
+                status_code = response.status_code
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            content_length = response.headers.get("Content-Length", "")
+            content_length = int(content_length) if content_length.isdigit() else None
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+        finally:
+            # For a streamed request this drops the connection without ever
+            # reading the body.
+            response.close()
+            request.response = None
+        return cls(
+            request.url,
+            status_code,
+            redirect_link,
+            retry_after=retry_after,
+            content_length=content_length,
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    @classmethod
+    def from_cache_entry(cls, entry):
+        return cls(
+            entry.url,
+            entry.status_code,
+            entry.redirect_link,
+            etag=entry.etag,
+            last_modified=entry.last_modified,
+        )
+
+    def __str__(self):
+        if self.exception is not None:
+            return f"{self.url} => {type(self.exception).__name__}"
+        return f"{self.url} => {self.status_code}"
+
+
+def _without_www(host: str) -> str:
+    return host[len("www."):] if host.startswith("www.") else host
+
+
+class ScanBase(PybActivity):
+    """
+        What the Scanner and AsyncScanner share: the scan levels and every
+        ScanResult found, kept in memory or in a ResultStore, and applying
+        check outcomes to them.
+
+        Links are resolved against the URL of their article. A link to an
+        article that was fetched while collecting is answered from
+        `fetched_pages`, only the other links are checked over the network.
+    """
+
+    tmp_total_links = 0
+
+    def __init__(
+        self,
+        verbose: bool,
+        domain: str,
+        verify_ssl: bool,
+        sort_query: bool = False,
+        result_store: ResultStore = None,
+    ):
+        super(ScanBase, self).__init__(verbose, domain, verify_ssl)
+        self.scan_levels = []
+        self.article_link_dict = {}
+        self._all_results = []
+        self.normalizer = LinkNormalizer(sort_query=sort_query)
+        # canonical scan link -> every ScanResult pointing at it, so responses
+        # can be matched without walking all results.
+        self._result_index = {}
+        # With a ResultStore the three structures above stay empty and every
+        # occurrence goes to the store instead, see _record_result.
+        self.result_store = result_store
+        self._article_positions = {}
+        # canonical article URL -> CheckOutcome of fetching it while collecting
+        self.fetched_pages = {}
+        self.page_cache_hits = 0
+
+    def add_level(self, scan_level: ScanLevel):
+        if scan_level not in self.scan_levels:
+            self.scan_levels.append(scan_level)
+        else:
+            raise DuplicateLevelException
+
+    def _iter_article_links(self):
+        if self.result_store is not None:
+            yield from self.result_store.iter_scan_links()
+            return
+        for v in self.article_link_dict.values():
+            # What if the link is still a string and not a list?
+            if isinstance(v, str):
+                yield v
+            elif isinstance(v, list):
+                yield from v
+            else:
+                raise InvalidLinkEntryException
+
+    def _create_normalized_link_list(self):
+        if self.verbose:
+            print("Normalizing the obtained link dictionary")
+
+        self._normalized_link_list = self.normalizer.normalize(
+            self._iter_article_links()
+        )
+
+        if self.verbose:
+            print(
+                f"Done normalizing, we reduced {self.tmp_total_links} links to"
+                f" {len(self._normalized_link_list)} !"
+            )
+            for rule, collapsed in self.normalizer.collapsed.most_common():
+                print(f"\t{rule} collapsed {collapsed} links")
+
+        if self.verbose:
+            print("Cleaning up links we can't query")
+
+        self._normalized_link_list = [
+            entry
+            for entry in self._normalized_link_list
+            if entry[:4] == "http" and "//localhost" not in entry
+        ]
+
+        if self.verbose:
+            print(f"{len(self._normalized_link_list)} links left after cleaning!")
+
+    def _record_result(self, scan_result: ScanResult):
+        canonical_link = self.normalizer.canonicalize(scan_result.scan_link)
+        if self.result_store is not None:
+            # Articles handed in outside collect_links go after the others.
+            position = self._article_positions.setdefault(
+                scan_result.parent_link, len(self._article_positions)
+            )
+            self.result_store.add(
+                position,
+                canonical_link,
+                scan_result.parent_text,
+                scan_result.parent_link,
+                scan_result.scan_link,
+            )
+            return
+
+        self._all_results.append(scan_result)
+        self._result_index.setdefault(canonical_link, []).append(scan_result)
+
+        parent_text, link_href = scan_result.parent_text, scan_result.scan_link
+        if parent_text in self.article_link_dict.keys():
+
+            if isinstance(self.article_link_dict[parent_text], str):
+                self.article_link_dict[parent_text] = [
+                    self.article_link_dict[parent_text],
+                    link_href,
+                ]
+            else:
+                self.article_link_dict[parent_text].append(link_href)
+        else:
+            self.article_link_dict[parent_text] = link_href
+
+    @property
+    def _level_specs(self) -> list:
+        return [level_spec(level) for level in self.scan_levels]
+
+    @property
+    def _level_salt(self) -> list:
+        # Stored hashes only count for the scan levels they were made with.
+        return [str(scan_level) for scan_level in self.scan_levels]
+
+    def _record_links(self, article: GatherLink, anchors: int, links: list):
+        self.tmp_total_links += anchors
+        if self.verbose:
+            print(f"We found {anchors} links in {article.text}.")
+        for link_href in links:
+            self._record_result(
+                ScanResult(
+                    article.text,
+                    article.link,
+                    join_href(article.link, link_href),
+                )
+            )
+
+    def _record_page(self, article: GatherLink, status_code: int, final_url: str):
+        if status_code == 304:
+            # Revalidated from the article store, this says nothing new.
+            return
+        canonical_link = self.normalizer.canonicalize(article.link)
+        self.fetched_pages[canonical_link] = CheckOutcome(
+            canonical_link, status_code, urllib.parse.unquote(final_url)
+        )
+
+    def _split_fetched(self):
+        """
+            (outcomes of links to pages fetched while collecting, links that
+            still need checking) for the normalized link list.
+        """
+        fetched, to_check = [], []
+        for url in self._normalized_link_list:
+            outcome = self.fetched_pages.get(url)
+            if outcome is not None:
+                fetched.append(outcome)
+            else:
+                to_check.append(url)
+        self.page_cache_hits = len(fetched)
+        if self.verbose:
+            print(f"{len(fetched)} links answered by pages fetched while collecting")
+        return fetched, to_check
+
+    def is_internal(self, url: str) -> bool:
+        """Whether `url` points into the scanned site (www. or not)."""
+        host = host_of(url)
+        return _without_www(host) == _without_www(self.domain.lower())
+
+    def _restore_article_order(self, chunks):
+        # Articles are handled in completion order, put their results back in
+        # gatherer order so the outcome matches a sequential crawl. Stored
+        # results carry their article's position and are read back in order.
+        if self.result_store is not None:
+            return
+        chunks.sort(key=lambda chunk: chunk[0])
+        self._all_results = []
+        self._result_index = {}
+        self.article_link_dict = {}
+        for _, results in chunks:
+            for scan_result in results:
+                self._record_result(scan_result)
+
+    @staticmethod
+    def _result_from_row(row) -> ScanResult:
+        scan_result = ScanResult(*row[:3])
+        (
+            scan_result.status_code,
+            scan_result.threw_exception,
+            scan_result.result_text,
+            scan_result.scan_done,
+        ) = (row[3], bool(row[4]), row[5], bool(row[6]))
+        return scan_result
+
+    def _flush_results(self):
+        if self.result_store is not None:
+            self.result_store.flush()
+
+    def _store_result(self, canonical_link: str, outcome: ScanResult):
+        rows = self.result_store.set_result(
+            canonical_link,
+            outcome.status_code,
+            outcome.threw_exception,
+            outcome.result_text,
+        )
+        return [self._result_from_row(row) for row in rows]
+
+    def _results_for(self, url: str):
+        canonical_link = self.normalizer.canonicalize(urllib.parse.unquote(url))
+        if self.result_store is not None:
+            rows = self.result_store.occurrences(canonical_link)
+            return [self._result_from_row(row) for row in rows]
+        return self._result_index.get(canonical_link, [])
+
+    @staticmethod
+    def _set_outcome(scan_result: ScanResult, outcome: CheckOutcome):
+        if outcome.exception is not None:
+            scan_result.set_result_by_exception(outcome.exception)
+        else:
+            scan_result.set_result_by_status_code(
+                outcome.status_code, outcome.redirect_link
+            )
+
+    def _apply_outcome(self, outcome: CheckOutcome):
+        if self.result_store is not None:
+            # Work the result out once, then write it to every stored occurrence.
+            scan_result = ScanResult("", "")
+            self._set_outcome(scan_result, outcome)
+            return self._store_result(outcome.url, scan_result)
+
+        scan_results = self._result_index.get(outcome.url, [])
+        for scan_result in scan_results:
+            self._set_outcome(scan_result, outcome)
+        return scan_results
+
+    def iter_links_by_article(self):
+        """(parent_text, [scan_link, ...]) for every article, in gatherer order."""
+        if self.result_store is not None:
+            yield from self.result_store.iter_links_by_article()
+            return
+        for parent_text, links in self.article_link_dict.items():
+            yield parent_text, [links] if isinstance(links, str) else links
+
+    @property
+    def get_normalized_link_list(self):
+        return self._normalized_link_list
+
+    @property
+    def internal_links(self) -> list:
+        return [url for url in self._normalized_link_list if self.is_internal(url)]
+
+    @property
+    def external_links(self) -> list:
+        return [
+            url for url in self._normalized_link_list if not self.is_internal(url)
+        ]
+
+    @property
+    def get_normalization_stats(self):
+        return self.normalizer.collapsed
+
+    @property
+    def get_article_link_dict(self):
+        if self.result_store is None:
+            return self.article_link_dict
+        # Builds the whole dict in memory, prefer iter_links_by_article().
+        article_link_dict = {}
+        for parent_text, links in self.result_store.iter_links_by_article():
+            known = article_link_dict.get(parent_text, [])
+            if isinstance(known, str):
+                known = [known]
+            known = known + links
+            article_link_dict[parent_text] = known[0] if len(known) == 1 else known
+        return article_link_dict
+
+    @property
+    def all_results(self):
+        """
+            Every ScanResult in gatherer order. With a result_store this is a
+            generator streaming them from the database.
+        """
+        if self.result_store is not None:
+            return (self._result_from_row(row) for row in self.result_store.iter_rows())
+        return self._all_results
@@ -0,0 +1,151 @@
+import socket
+import time
+
+import gevent.event
+import grequests  # noqa: F401, patches ssl before urllib3 imports it
+import requests.adapters
+import requests.exceptions
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import (
+    LocationParseError,
+    LocationValueError,
+    NewConnectionError,
+)
+
+
+class DNSCache(object):
+    """
+        Resolves every host once per `ttl` seconds, however many links point at
+        it. Failed lookups are remembered for `negative_ttl`, so the links to a
+        domain that no longer exists fail at once instead of each waiting for
+        the resolver again. Concurrent lookups of the same host share one query.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        negative_ttl: float = 60.0,
+        resolver=None,
+        clock=time.monotonic,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.resolver = resolver
+        self.clock = clock
+        self.lookups = 0
+
+        # host -> (expires_at, addresses or the error the lookup raised)
+        self._entries = {}
+        # host -> AsyncResult of the lookup in progress
+        self._pending = {}
+
+    def _lookup(self, host: str):
+        # Looked up on every call so gevent's cooperative resolver is used
+        # once grequests has patched socket.
+        resolver = self.resolver or socket.getaddrinfo
+        self.lookups += 1
+        try:
+            # Checked here, getaddrinfo would fail on it in a resolver thread.
+            host.encode("idna")
+            return resolver(host, None, 0, socket.SOCK_STREAM), self.ttl
+        except OSError as ex:
+            return ex, self.negative_ttl
+        except (UnicodeError, ValueError) as ex:
+            # Not a host name, e.g. a label over 63 characters.
+            error = requests.exceptions.InvalidURL(f"Invalid host {host!r}: {ex}")
+            error.__cause__ = ex
+            return error, self.negative_ttl
+
+    def resolve(self, host: str) -> list:
+        """
+            getaddrinfo() results for `host`. Raises the lookup's OSError, or
+            requests' InvalidURL when `host` isn't a valid host name.
+        """
+        entry = self._entries.get(host)
+        if entry is not None and entry[0] > self.clock():
+            result = entry[1]
+        elif host in self._pending:
+            result = self._pending[host].get()
+        else:
+            pending = self._pending[host] = gevent.event.AsyncResult()
+            try:
+                result, ttl = self._lookup(host)
+                self._entries[host] = (self.clock() + ttl, result)
+            except BaseException as ex:
+                result = ex
+                raise
+            finally:
+                # Whatever happened, or the lookups waiting on this one block
+                # forever.
+                del self._pending[host]
+                pending.set(result)
+
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CachedDNSConnection(object):
+    """
+        Mixed into urllib3's connection classes so new connections go to the
+        addresses in `dns_cache` instead of calling getaddrinfo every time.
+        TLS still checks the certificate against the host name.
+    """
+
+    dns_cache = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = self.dns_cache.resolve(host)
+        except requests.exceptions.InvalidURL as ex:
+            # As urllib3 raises it for such a name. requests' exceptions are
+            # OSErrors, urllib3 would report this one as a dropped connection.
+            raise LocationParseError(host) from ex
+        except OSError as ex:
+            raise NewConnectionError(self, f"Failed to resolve {host}: {ex}")
+
+        error = None
+        # Same order as getaddrinfo gave them, once each.
+        for address in dict.fromkeys(sockaddr[0] for *_, sockaddr in addresses):
+            self._dns_host = address
+            try:
+                return super(CachedDNSConnection, self)._new_conn()
+            except NewConnectionError as ex:
+                error = ex
+            finally:
+                self._dns_host = host
+        raise error
+
+
+def _with_dns_cache(pool_class, dns_cache: DNSCache):
+    connection_class = type(
+        pool_class.ConnectionCls.__name__,
+        (CachedDNSConnection, pool_class.ConnectionCls),
+        {"dns_cache": dns_cache},
+    )
+    return type(pool_class.__name__, (pool_class,), {"ConnectionCls": connection_class})
+
+
+class CachedDNSAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter whose connections resolve their host through a DNSCache."""
+
+    def __init__(self, dns_cache: DNSCache, **kwargs):
+        self.dns_cache = dns_cache
+        super(CachedDNSAdapter, self).__init__(**kwargs)
+
+    def send(self, request, *args, **kwargs):
+        try:
+            return super(CachedDNSAdapter, self).send(request, *args, **kwargs)
+        except LocationValueError as ex:
+            raise requests.exceptions.InvalidURL(ex, request=request)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(CachedDNSAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _with_dns_cache(HTTPConnectionPool, self.dns_cache),
+            "https": _with_dns_cache(HTTPSConnectionPool, self.dns_cache),
+        }
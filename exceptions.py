@@ -46,3 +46,36 @@ class UnknownDictExceptionError(Exception):
         # Todo: Write docs for how to fix.
         msg = "Oof! You ran into an exception that's not yet in our dict"
         super(NoLinksInScanLevel, self).__init__(self, msg)
+
+
+class UnknownParserBackendException(Exception):
+    def __init__(self, backend):
+        msg = (
+            f"Parser backend {backend!r} is not available. Use 'html.parser', "
+            "'lxml' (when installed) or 'auto'."
+        )
+        super(UnknownParserBackendException, self).__init__(self, msg)
+
+
+class InvalidSitemapException(Exception):
+    def __init__(self, url):
+        msg = f"The sitemap at {url} could not be read as sitemap XML."
+        super(InvalidSitemapException, self).__init__(self, msg)
+
+
+class HostShortCircuitedException(Exception):
+    def __init__(self, host, cause):
+        self.host = host
+        self.cause = cause
+        msg = (
+            f"Not requested: {host} already failed to connect"
+            f" ({type(cause).__name__}), the rest of its links are skipped."
+        )
+        super(HostShortCircuitedException, self).__init__(self, msg)
+
+
+class InvalidShardFileException(Exception):
+    def __init__(self, path, reason):
+        self.path = path
+        msg = f"Can't merge {path}: {reason}"
+        super(InvalidShardFileException, self).__init__(self, msg)
@@ -52,3 +52,13 @@ SAFARI_MOBILE = {
                   "AppleWebKit/605.1.15 (KHTML, like Gecko) Version/11.0 "
                   "Mobile/15E148 Safari/604.1",
 }
+
+
+def conditional_headers(etag=None, last_modified=None):
+    """Headers that make a request conditional on the given validators."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
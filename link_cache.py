@@ -0,0 +1,152 @@
+import sqlite3
+import time
+
+from http_headers import conditional_headers
+
+HOUR = 60 * 60
+
+# How long a cached check stays fresh, per status class.
+DEFAULT_TTL = {
+    "2xx": 7 * 24 * HOUR,
+    "3xx": 24 * HOUR,
+    "4xx": HOUR,
+    "5xx": 10 * 60,
+}
+
+
+class CacheEntry(object):
+    __slots__ = (
+        "url",
+        "status_code",
+        "redirect_link",
+        "checked_at",
+        "etag",
+        "last_modified",
+    )
+
+    def __init__(
+        self, url, status_code, redirect_link, checked_at, etag=None, last_modified=None
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.redirect_link = redirect_link
+        self.checked_at = checked_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def validators(self) -> dict:
+        return conditional_headers(self.etag, self.last_modified)
+
+
+class LinkCache(object):
+    """
+        On-disk (SQLite) cache of link check results keyed by canonical URL.
+
+        An entry is fresh for the TTL of its status class, see DEFAULT_TTL, so
+        good links are trusted for a long time while errors are rechecked soon.
+        Stale entries are kept: when they carry an ETag or Last-Modified the
+        checker revalidates them with a conditional request, and a 304 just
+        refreshes the entry. Once more than `max_entries` are stored the least
+        recently used ones are evicted.
+
+        Use path=":memory:" for a cache that only lives as long as the object.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: dict = None,
+        max_entries: int = 100_000,
+        clock=time.time,
+    ):
+        self.path = path
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.max_entries = max_entries
+        self.clock = clock
+
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            " url TEXT PRIMARY KEY,"
+            " status_code INTEGER NOT NULL,"
+            " redirect_link TEXT NOT NULL,"
+            " checked_at REAL NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS links_last_used ON links (last_used)"
+        )
+        self._size = self._db.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+
+    def ttl_for(self, status_code: int) -> float:
+        return self.ttl.get(f"{status_code // 100}xx", 0)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self.clock() - entry.checked_at < self.ttl_for(entry.status_code)
+
+    def lookup(self, url: str) -> CacheEntry:
+        row = self._db.execute(
+            "SELECT url, status_code, redirect_link, checked_at, etag, last_modified"
+            " FROM links WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE links SET last_used = ? WHERE url = ?", (self.clock(), url)
+        )
+        return CacheEntry(*row)
+
+    def store(
+        self,
+        url: str,
+        status_code: int,
+        redirect_link: str,
+        etag: str = None,
+        last_modified: str = None,
+    ):
+        now = self.clock()
+        cursor = self._db.execute(
+            "UPDATE links SET status_code = ?, redirect_link = ?, checked_at = ?,"
+            " etag = ?, last_modified = ?, last_used = ? WHERE url = ?",
+            (status_code, redirect_link, now, etag, last_modified, now, url),
+        )
+        if cursor.rowcount == 0:
+            self._db.execute(
+                "INSERT INTO links VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, status_code, redirect_link, now, etag, last_modified, now),
+            )
+            self._size += 1
+            if self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+
+    def refresh(self, entry: CacheEntry):
+        """The server confirmed `entry` is unchanged (304)."""
+        self.store(
+            entry.url,
+            entry.status_code,
+            entry.redirect_link,
+            entry.etag,
+            entry.last_modified,
+        )
+
+    def _evict(self, count: int):
+        self._db.execute(
+            "DELETE FROM links WHERE url IN"
+            " (SELECT url FROM links ORDER BY last_used LIMIT ?)",
+            (count,),
+        )
+        self._size -= count
+
+    def flush(self):
+        self._db.commit()
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def __len__(self):
+        return self._size
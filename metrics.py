@@ -0,0 +1,226 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from scheduler import host_of
+
+# Latency histogram upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phases the Gatherer and Scanner report.
+PHASES = ("index_fetch", "article_fetch", "parse", "link_check")
+
+
+def status_class(status_code: int = None) -> str:
+    return "exception" if status_code is None else f"{status_code // 100}xx"
+
+
+class Histogram(object):
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.total += value
+        self.count += 1
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf."""
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            yield bound, running
+        yield float("inf"), self.count
+
+    def to_dict(self) -> dict:
+        return {
+            "buckets": {str(bound): count for bound, count in self.cumulative()},
+            "sum": self.total,
+            "count": self.count,
+        }
+
+
+class RequestEvent(object):
+    """What the request hooks get to see, filled in as the request goes."""
+
+    __slots__ = (
+        "phase",
+        "method",
+        "url",
+        "host",
+        "started_at",
+        "status_code",
+        "elapsed",
+        "size",
+        "redirects",
+        "exception",
+    )
+
+    def __init__(self, phase: str, method: str, url: str, started_at: float):
+        self.phase = phase
+        self.method = method
+        self.url = url
+        self.host = host_of(url)
+        self.started_at = started_at
+        self.status_code = None
+        self.elapsed = None
+        self.size = None
+        self.redirects = 0
+        self.exception = None
+
+
+class Metrics(object):
+    """
+        Timers, counters and per-host latency histograms for a crawl.
+
+        Gatherer, Scanner and LinkChecker report into the Metrics they are
+        given (the Scanner shares its Gatherer's by default):
+
+        - the wall time spent in each of PHASES,
+        - requests, response bytes, redirects, retries and responses per status
+          class, all per phase,
+        - the time to the response headers per host.
+
+        Callables appended to `on_request_start` and `on_request_finish` get the
+        RequestEvent of every request. Export with to_json() or to_prometheus().
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=time.perf_counter):
+        self.buckets = buckets
+        self.clock = clock
+        self.phase_seconds = Counter()
+        # (counter, phase, status class or None) -> value
+        self.counters = Counter()
+        self.host_latency = {}
+        self.on_request_start = []
+        self.on_request_finish = []
+
+    @contextmanager
+    def phase(self, name: str):
+        started_at = self.clock()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += self.clock() - started_at
+
+    def timed(self, name: str, iterable, excluding=()):
+        """
+            Iterate `iterable`, counting only the time spent producing items
+            towards phase `name`, not the time the caller spends on them.
+            Time the phases in `excluding` are credited with meanwhile, like
+            a lazy gatherer feeding the article fetches, isn't counted again.
+        """
+        iterator = iter(iterable)
+
+        def excluded():
+            return sum(self.phase_seconds[phase] for phase in excluding)
+
+        while True:
+            started_at, excluded_before = self.clock(), excluded()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed = self.clock() - started_at
+                elapsed -= excluded() - excluded_before
+                self.phase_seconds[name] += max(0.0, elapsed)
+            yield item
+
+    def count(self, counter: str, phase: str, amount=1, status: str = None):
+        self.counters[(counter, phase, status)] += amount
+
+    def request_started(self, phase: str, method: str, url: str) -> RequestEvent:
+        event = RequestEvent(phase, method, url, self.clock())
+        self.count("requests", phase)
+        for hook in self.on_request_start:
+            hook(event)
+        return event
+
+    def request_finished(
+        self, event: RequestEvent, response=None, exception=None, size=None
+    ):
+        if response is not None:
+            event.status_code = response.status_code
+            event.elapsed = response.elapsed.total_seconds()
+            event.redirects = len(response.history)
+            if size is None and response.headers.get("Content-Length", "").isdigit():
+                size = int(response.headers["Content-Length"])
+        else:
+            event.elapsed = self.clock() - event.started_at
+        event.size = size
+        event.exception = exception
+
+        self.count("responses", event.phase, status=status_class(event.status_code))
+        if event.redirects:
+            self.count("redirects", event.phase, event.redirects)
+        if size:
+            self.count("response_bytes", event.phase, size)
+        histogram = self.host_latency.get(event.host)
+        if histogram is None:
+            histogram = self.host_latency[event.host] = Histogram(self.buckets)
+        histogram.observe(event.elapsed)
+
+        for hook in self.on_request_finish:
+            hook(event)
+
+    def to_dict(self) -> dict:
+        counters = {}
+        for (counter, phase, status), value in sorted(
+            self.counters.items(), key=lambda item: tuple(map(str, item[0]))
+        ):
+            by_phase = counters.setdefault(counter, {})
+            if status is None:
+                by_phase[phase] = value
+            else:
+                by_phase.setdefault(phase, {})[status] = value
+        return {
+            "phase_seconds": dict(self.phase_seconds),
+            "counters": counters,
+            "host_latency": {
+                host: histogram.to_dict()
+                for host, histogram in sorted(self.host_latency.items())
+            },
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self, prefix: str = "pyblix") -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = [f"# TYPE {prefix}_phase_seconds_total counter"]
+        for phase, seconds in sorted(self.phase_seconds.items()):
+            lines.append(f'{prefix}_phase_seconds_total{{phase="{phase}"}} {seconds}')
+
+        names = sorted({counter for counter, _, _ in self.counters})
+        for counter in names:
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            for (name, phase, status), value in sorted(
+                self.counters.items(), key=lambda item: tuple(map(str, item[0]))
+            ):
+                if name != counter:
+                    continue
+                labels = f'phase="{phase}"'
+                if status is not None:
+                    labels += f',status_class="{status}"'
+                lines.append(f"{prefix}_{counter}_total{{{labels}}} {value}")
+
+        histogram_name = f"{prefix}_host_latency_seconds"
+        lines.append(f"# TYPE {histogram_name} histogram")
+        for host, histogram in sorted(self.host_latency.items()):
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else bound
+                labels = f'host="{host}",le="{le}"'
+                lines.append(f"{histogram_name}_bucket{{{labels}}} {count}")
+            lines.append(f'{histogram_name}_sum{{host="{host}"}} {histogram.total}')
+            lines.append(f'{histogram_name}_count{{host="{host}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
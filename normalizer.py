@@ -0,0 +1,110 @@
+import functools
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Characters handle_frame already strips from the end of a link.
+TRAILING_MARKS = "?#…"
+
+
+class LinkNormalizer(object):
+    """
+        Turns the links found in articles into a deterministic, duplicate free
+        list of canonical URLs.
+
+        Canonicalization lowercases scheme and host, drops default ports and
+        fragments, strips the trailing ?/#/… marks, gives an empty path a
+        "/" and (optionally) sorts query parameters. Equivalent links therefore
+        end up as one entry and are checked only once.
+
+        After normalize() the `collapsed` counter tells how many links each rule
+        merged into an entry that was already in the list: the rules that
+        rewrote the merged spelling, or the first spelling's rules when the
+        merged one was canonical already.
+
+        The canonical forms of the last `cache_size` distinct links are kept,
+        links repeat across articles but memory stays bounded on huge scans.
+    """
+
+    def __init__(self, sort_query: bool = False, cache_size: int = 65536):
+        self.sort_query = sort_query
+        self.collapsed = Counter()
+        self._canonical_form = functools.lru_cache(maxsize=cache_size)(
+            self._build_canonical_form
+        )
+
+    def canonicalize(self, url: str) -> str:
+        return self._canonical_form(url)[0]
+
+    def _build_canonical_form(self, url: str):
+        rules = set()
+
+        stripped = url.replace("…", "").rstrip(TRAILING_MARKS)
+        if stripped != url:
+            rules.add("trailing_marks")
+
+        try:
+            parts = urlsplit(stripped)
+            port = parts.port
+        except ValueError:
+            # Not something we can take apart, keep it as it is.
+            return stripped, frozenset(rules)
+
+        # urlsplit already lowercases the scheme, so compare with the raw text.
+        scheme = parts.scheme
+        if not stripped.startswith(scheme):
+            rules.add("scheme_case")
+
+        userinfo, _, hostport = parts.netloc.rpartition("@")
+        if hostport.startswith("["):
+            raw_host = hostport[: hostport.find("]") + 1]
+        else:
+            raw_host = hostport.split(":")[0]
+        host = raw_host.lower()
+        if host != raw_host:
+            rules.add("host_case")
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            host = f"{host}:{port}"
+        elif port is not None:
+            rules.add("default_port")
+        netloc = f"{userinfo}@{host}" if userinfo else host
+
+        path = parts.path
+        if not path and netloc:
+            path = "/"
+            rules.add("root_path")
+
+        query = parts.query
+        if self.sort_query and query:
+            sorted_query = "&".join(sorted(query.split("&")))
+            if sorted_query != query:
+                query = sorted_query
+                rules.add("query_order")
+
+        if parts.fragment:
+            rules.add("fragment")
+
+        return urlunsplit((scheme, netloc, path, query, "")), frozenset(rules)
+
+    def normalize(self, links) -> list:
+        """
+            Canonicalize every link in one pass and return the canonical URLs
+            in order of first appearance.
+        """
+        self.collapsed = Counter()
+        # canonical URL -> (raw spellings seen so far, rules of the first one)
+        entries = {}
+        for link in links:
+            canonical, rules = self._canonical_form(link)
+            entry = entries.get(canonical)
+            if entry is None:
+                entries[canonical] = ({link}, rules)
+                continue
+
+            spellings, first_rules = entry
+            if link in spellings:
+                self.collapsed["duplicate"] += 1
+            else:
+                spellings.add(link)
+                self.collapsed.update(rules or first_rules)
+        return list(entries)
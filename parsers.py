@@ -0,0 +1,203 @@
+import functools
+import urllib.parse
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+from article_store import content_hash
+from exceptions import UnknownParserBackendException
+
+try:
+    import lxml  # noqa: F401
+
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+# "html.parser" is pure Python and always there, "lxml" is C-backed and
+# much faster but optional.
+PARSER_BACKENDS = ("html.parser", "lxml")
+
+
+def resolve_backend(backend: str = "html.parser") -> str:
+    """
+        Check `backend` is usable. "auto" picks lxml when it is installed and
+        falls back to html.parser otherwise.
+    """
+    if backend == "auto":
+        return "lxml" if HAVE_LXML else "html.parser"
+    if backend not in PARSER_BACKENDS or (backend == "lxml" and not HAVE_LXML):
+        raise UnknownParserBackendException(backend)
+    return backend
+
+
+def level_spec(level) -> tuple:
+    """
+        (html_tag, ((attribute, value), ...), css) describing what `level`
+        matches. Plain data, so it can be hashed and sent to a worker process.
+    """
+    spec = getattr(level, "spec", None)
+    if spec is not None:
+        return spec
+    attrs = ()
+    if level.html_attrib is not None:
+        attrs = ((level.html_attrib, level.html_attrib_val),)
+    return level.html_tag, attrs, None
+
+
+def _attr_matches(element, name: str, expected) -> bool:
+    # Same rules as find_all(tag, {name: expected}): a multi-valued attribute
+    # like class matches one of its values or the whole value.
+    actual = element.get(name)
+    if actual is None:
+        return False
+    if expected is True:
+        return True
+    if isinstance(actual, list):
+        return expected in actual or " ".join(actual) == expected
+    return actual == expected
+
+
+class LevelMatcher(object):
+    """
+        Several levels compiled into one test of "does this element match any
+        of them". Tag and attribute levels are looked up by tag name, CSS
+        levels are compiled with soupsieve once.
+
+        `tags` are the tag names a match can have, None when any tag can.
+    """
+
+    def __init__(self, specs):
+        self._by_tag = {}
+        self._any_tag = []
+        self._selectors = []
+        for html_tag, attrs, css in specs:
+            if css is not None:
+                self._selectors.append(soupsieve.compile(css))
+            elif html_tag is None:
+                self._any_tag.append(attrs)
+            else:
+                self._by_tag.setdefault(html_tag, []).append(attrs)
+
+        self.tags = None
+        if not self._selectors and not self._any_tag:
+            self.tags = sorted(self._by_tag)
+
+    def _attrs_match(self, element, candidates) -> bool:
+        for attrs in candidates:
+            if all(_attr_matches(element, name, value) for name, value in attrs):
+                return True
+        return False
+
+    def __call__(self, element) -> bool:
+        return (
+            self._attrs_match(element, self._by_tag.get(element.name, ()))
+            or self._attrs_match(element, self._any_tag)
+            or any(selector.match(element) for selector in self._selectors)
+        )
+
+
+@functools.lru_cache(maxsize=32)
+def compile_levels(specs: tuple) -> LevelMatcher:
+    return LevelMatcher(specs)
+
+
+def _parse(markup, tags, backend: str, encoding: str = None) -> BeautifulSoup:
+    strainer = None if tags is None else SoupStrainer(tags)
+    if isinstance(markup, bytes):
+        return BeautifulSoup(
+            markup, backend, parse_only=strainer, from_encoding=encoding
+        )
+    return BeautifulSoup(markup, backend, parse_only=strainer)
+
+
+def parse_levels(
+    markup, levels, backend: str = "html.parser", encoding: str = None
+) -> BeautifulSoup:
+    """
+        Parse only what `levels` can match.
+
+        The strainer keeps every element whose tag name one of the levels uses,
+        together with everything inside it, and drops the rest of the page
+        while parsing. Looking the levels up in the result with find/find_all
+        gives the same elements as on a full tree, without building one.
+        Levels that can match any tag, like CSS selectors, need the full tree.
+
+        Raw bytes are decoded with `encoding` when given.
+    """
+    matcher = compile_levels(tuple(level_spec(level) for level in levels))
+    return _parse(markup, matcher.tags, backend, encoding)
+
+
+def clean_href(href: str) -> str:
+    link_href = urllib.parse.unquote(href)
+    if link_href[-1:] in ["?", "\u2026", "#"]:
+        link_href = link_href[:-1]
+    return link_href
+
+
+def join_href(base: str, href: str) -> str:
+    """`href` resolved against `base`, as it is when urllib can't parse it."""
+    try:
+        return urllib.parse.urljoin(base, href)
+    except ValueError:
+        # e.g. "http://[::1/bad", reported as an invalid URL by the check
+        return href
+
+
+def _frame_of(element, matcher: LevelMatcher, frames: dict):
+    """
+        The outermost ancestor-or-self of `element` a level matches, None if
+        there is none. `frames` remembers the answer for every element on
+        the way, so each element of the document is tested at most once.
+    """
+    path = []
+    frame = None
+    while element is not None and element.parent is not None:
+        known = frames.get(id(element), path)
+        if known is not path:
+            frame = known
+            break
+        path.append(element)
+        element = element.parent
+    for element in reversed(path):
+        if frame is None and matcher(element):
+            frame = element
+        frames[id(element)] = frame
+    return frame
+
+
+def extract_links(
+    markup, levels, backend: str = "html.parser", salt=None, encoding: str = None
+):
+    """
+        Parse one article and return (anchors seen, hrefs, frame hash).
+
+        Takes and returns plain data only, so it can run in a worker process:
+        `levels` are level_spec() tuples. The document is walked once, every
+        anchor inside any level counts once however many levels (nested or
+        overlapping) contain it. The frame hash covers the outermost matching
+        elements and is only computed when a `salt` (the scan levels, for the
+        article store) is given.
+    """
+    matcher = compile_levels(tuple(levels))
+    soup = _parse(markup, matcher.tags, backend, encoding)
+
+    anchors = 0
+    hrefs = []
+    frames = []
+    known_frames = {}
+    for link in soup.find_all("a"):
+        frame = _frame_of(link.parent, matcher, known_frames)
+        if frame is None:
+            continue
+        # Anchors come in document order and frames don't nest, so the
+        # anchors of a frame are consecutive.
+        if not frames or frames[-1] is not frame:
+            frames.append(frame)
+        anchors += 1
+        if link.has_attr("href"):
+            hrefs.append(clean_href(link["href"]))
+
+    frame_hash = None if salt is None else content_hash(*salt, *frames)
+    return anchors, hrefs, frame_hash
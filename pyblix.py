@@ -1,38 +1,50 @@
-import copy
-
 # import re
+import concurrent.futures
+import multiprocessing
 import urllib.parse
-
-from http_headers import FIREFOX_LINUX
+from collections import Counter
 
 from exceptions import (
-    DuplicateLevelException,
-    InvalidLinkEntryException,
     InvalidParentLevelException,
     InvalidTargetException,
     NoLinksInScanLevel,
-    UnknownDictExceptionError,
 )
-from urllib.parse import urlparse
 
+import gevent
+import gevent.queue
 import grequests
 import requests
-from bs4 import BeautifulSoup
-
-from base import PybActivity, PybLevel, PybLink
-
-
-class GatherLink(PybLink):
-    def __init__(self, text, link):
-        super(GatherLink, self).__init__(text, link)
-
-
-class GatherLevel(PybLevel):
-    def __init__(self, html_tag: str, html_attrib: str, html_attrib_val: str):
-        super(GatherLevel, self).__init__(html_tag, html_attrib, html_attrib_val)
+from gevent.pool import Pool
+
+from article_store import ArticleStore, content_hash
+from checker import LinkChecker
+from core import (  # noqa: F401, re-exported
+    EXCEPTION_READABLE,
+    STATUS_READABLE,
+    CheckOutcome,
+    GatherBase,
+    GatherLevel,
+    GatherLink,
+    NextPageLevel,
+    PageTemplate,
+    ScanBase,
+    ScanLevel,
+    ScanResult,
+)
+from link_cache import LinkCache
+from metrics import Metrics
+from parsers import (
+    clean_href,
+    extract_links,
+    join_href,
+    parse_levels,
+    resolve_backend,
+)
+from result_store import ResultStore
+from sessions import SessionPool, imap_requests
 
 
-class Gatherer(PybActivity):
+class Gatherer(GatherBase):
     """
         pyblix.Gatherer is the initialization phase for pyblix.Scanner.
 
@@ -42,12 +54,18 @@ class Gatherer(PybActivity):
 
         This GatherLevel can then be passed to the Gatherer that will scan for all
         your articles/posts.
+
+        Archives spread over several indexes can be gathered too: pass the extra
+        index pages as `root_pages` and a NextPageLevel or PageTemplate as
+        `pagination`. Those pages are fetched `index_workers` at a time and
+        article URLs are deduplicated across all of them. With lazy=True nothing
+        is fetched up front, the Scanner then starts on the first articles while
+        the rest of the archive is still being enumerated.
     """
 
     _user_agent = (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:73.0) Gecko/20100101 Firefox/73.0"
     )
-    request_headers = FIREFOX_LINUX
 
     def __init__(
         self,
@@ -56,12 +74,32 @@ class Gatherer(PybActivity):
         article_root_page: str,
         parent_level: GatherLevel,
         verbose: bool = False,
+        parser: str = "html.parser",
+        root_pages: list = None,
+        pagination=None,
+        index_workers: int = 4,
+        lazy: bool = False,
+        sessions: SessionPool = None,
+        metrics: Metrics = None,
     ):
-        super(Gatherer, self).__init__(verbose, domain, verify_ssl)
-        self.article_root_page = article_root_page
-        self.identifiable_parent_level = parent_level
+        super(Gatherer, self).__init__(
+            domain,
+            verify_ssl,
+            article_root_page,
+            parent_level,
+            verbose,
+            parser,
+            root_pages,
+            pagination,
+            index_workers,
+        )
+        self.sessions = sessions if sessions is not None else SessionPool(index_workers)
+        self.metrics = metrics if metrics is not None else Metrics()
+        if not lazy:
+            for _ in self.iter_gather_links():
+                pass
 
-        self.gather_links = []
+    def _gather(self):
         if self.verbose:
             print(f"Validating URL: {self.article_root_page}")
         self._validate_url()
@@ -69,175 +107,196 @@ class Gatherer(PybActivity):
         if self.verbose:
             print(f"Validating parent level: {self.identifiable_parent_level}")
         self._validate_parent_level()
+        yield from self.gather_links
 
-    def _validate_url(self):
-        with requests.Session() as _sess:
-            root_response = _sess.get(
-                url=self.article_root_page,
-                verify=self.verify_ssl,
-                headers=self.request_headers,
+        if len(self.root_pages) > 1 or self.pagination is not None:
+            yield from self._crawl_index_pages()
+        self._gathered = True
+
+    def _get(self, url: str):
+        event = self.metrics.request_started("index_fetch", "GET", url)
+        try:
+            response = self.sessions.for_url(url).get(
+                url=url, verify=self.verify_ssl, headers=self.request_headers,
             )
+        except requests.exceptions.RequestException as ex:
+            self.metrics.request_finished(event, exception=ex)
+            raise
+        self.metrics.request_finished(event, response, size=len(response.content))
+        return response
 
-            if root_response.status_code == 200:
-                self.article_root_html = root_response.text
-                self.article_root_soup = BeautifulSoup(
-                    self.article_root_html, "html.parser"
-                )
-            else:
-                raise InvalidTargetException
+    def _validate_url(self):
+        root_response = self._get(self.article_root_page)
+
+        if root_response.status_code == 200:
+            self.article_root_html = root_response.text
+            self.article_root_soup = parse_levels(
+                self.article_root_html, self._index_levels, self.parser,
+            )
+        else:
+            raise InvalidTargetException
 
     def _validate_parent_level(self):
-        html_attrib = self.identifiable_parent_level.html_attrib
-        html_attrib_val = self.identifiable_parent_level.html_attrib_val
-        self.parent_level_soup = self.article_root_soup.find(
-            self.identifiable_parent_level.html_tag, {html_attrib: html_attrib_val},
-        )
+        self.parent_level_soup = self._find_parent_level(self.article_root_soup)
 
         try:
             all_links = self.parent_level_soup.find_all("a")
-            for link in all_links:
-                glink = GatherLink(link.text, link["href"])
-                self.gather_links.append(glink)
         except AttributeError:
             raise InvalidParentLevelException
+        self._add_gather_links(all_links, self.article_root_page)
 
-    @property
-    def number_of_gather_links(self):
-        return len(self.gather_links)
-
-
-class ScanLevel(PybLevel):
-    def __init__(self, html_tag, html_attrib, html_attrib_val):
-        super(ScanLevel, self).__init__(html_tag, html_attrib, html_attrib_val)
+    def _fetch_index_page(self, url: str, root: str, arrived):
+        # Whatever happens the crawl hears back, or it would wait forever.
+        response, error = None, None
+        try:
+            response = self._get(url)
+        except requests.exceptions.RequestException:
+            pass
+        except Exception as ex:
+            error = ex
+        arrived.put((url, root, response, error))
+
+    def _crawl_index_pages(self):
+        pool = Pool(self.index_workers)
+        arrived = gevent.queue.Queue()
+        requested = {self.article_root_page}
+        # root page -> its index pages that are requested but not back yet
+        in_flight = Counter()
+        # root page -> numbered pages of that root still to request
+        numbered = {}
+
+        def request(url, root):
+            if url is not None and url not in requested:
+                requested.add(url)
+                in_flight[root] += 1
+                pool.spawn(self._fetch_index_page, url, root, arrived)
+
+        def top_up(root):
+            # Only run index_workers numbered pages ahead, we don't know where
+            # the archive ends.
+            pages = numbered.get(root)
+            while pages is not None and in_flight[root] < self.index_workers:
+                url = next(pages, None)
+                if url is None:
+                    del numbered[root]
+                    return
+                request(url, root)
+
+        if isinstance(self.pagination, PageTemplate):
+            numbered = {root: self.pagination.pages(root) for root in self.root_pages}
+        for root in self.root_pages[1:]:
+            request(root, root)
+        request(self._next_page(self.article_root_soup, self.article_root_page),
+                self.article_root_page)
+        for root in list(numbered):
+            top_up(root)
 
+        try:
+            while sum(in_flight.values()):
+                url, root, response, error = arrived.get()
+                in_flight[root] -= 1
+                if error is not None:
+                    raise error
+
+                if response is None or response.status_code != 200:
+                    if url == root:
+                        raise InvalidTargetException
+                    # Past the last numbered page, or a broken one.
+                    numbered.pop(root, None)
+                    continue
+
+                soup = parse_levels(response.text, self._index_levels, self.parser)
+                parent = self._find_parent_level(soup)
+                if parent is None:
+                    if url == root:
+                        raise InvalidParentLevelException
+                    numbered.pop(root, None)
+                    continue
 
-class ScanResult(object):
-    def __init__(self, parent_text, parent_link):
-        self.parent_text = parent_text
-        self.parent_link = parent_link
+                if self.verbose:
+                    print(f"Gathering articles from index page {url}")
+                yield from self._add_gather_links(parent.find_all("a"), url)
+                request(self._next_page(soup, url), root)
+                top_up(root)
+        finally:
+            # A failed crawl, or a caller that stopped early, leaves no
+            # fetches running.
+            pool.kill()
 
-        self.scan_link = ""
 
-        self.status_code = 0
-        self.threw_exception = False
-        self.result_text = ""
-        self.scan_done = False
+class ArticleRequest(grequests.AsyncRequest):
+    """
+        GET request for one article that remembers which article it belongs to
+        and where that article sits in the gatherer's list.
+    """
 
-    def set_scan_link(self, link):
-        self.scan_link = link
+    def __init__(self, position: int, article: GatherLink, event=None, **kwargs):
+        super(ArticleRequest, self).__init__("GET", article.link, **kwargs)
+        self.position = position
+        self.event = event
+        self.article = article
 
-    def set_result_by_exception(self, excep):
-        exception_readable_dict = {
-            requests.exceptions.SSLError: "ERR: SSL Error",
-            # TODO: Maybe find a way to clean these up? re?
-            requests.exceptions.InvalidURL: "ERR: URL Invalid",
-            requests.exceptions.ConnectionError: "ERR: Couldn't connect",
-            TypeError: "ERR: Unreadable response",  # Lol wth
-            requests.exceptions.ConnectTimeout: "ERR: Timed out",
-            requests.exceptions.ReadTimeout: "ERR: Read timed out",
-        }
 
-        # Response object will be none so we need to add it to dict here
-        try:
-            self.threw_exception = True
-            self.result_text = exception_readable_dict[type(excep)]
-            self.scan_done = True
-        except KeyError as ex:
-            print(ex)
-            raise UnknownDictExceptionError
-
-    def set_result_by_status_code(self, status_code, redir_link=""):
-        response_code_readable_dict = {
-            200: "OK: All Good!",
-            201: "OK: API Created response (?)",
-            202: "OK: Accepted",
-            301: "WRN: Moved permanently to {}",
-            302: "WRN: Redirected to {}",
-            400: "ERR: Bad Request",
-            401: "ERR: Unauthorized",
-            403: "ERR: Forbidden",
-            404: "ERR: Not Found",
-            405: "ERR: Get not allowed (?)",
-            406: "ERR: Unacceptable request",
-            429: "CRIT: Too many requests you filthy animal",
-            500: "ERR: Internal Server Error",
-            502: "ERR: Bad Gateway",
-            503: "ERR: Service Unavailable",
-        }
-
-        self.status_code = status_code
-        self.result_text = response_code_readable_dict[status_code].format(redir_link)
-        self.scan_done = True
-
-
-class Scanner(PybActivity):
-    tmp_total_links = 0
-
-    def __init__(self, gatherer: Gatherer, timeout: int = 3):
+class Scanner(ScanBase):
+    def __init__(
+        self,
+        gatherer: Gatherer,
+        timeout: int = 3,
+        fetch_workers: int = 8,
+        sessions: SessionPool = None,
+        sort_query: bool = False,
+        scan_workers: int = None,
+        check_mode: str = "get",
+        link_cache: LinkCache = None,
+        checker: LinkChecker = None,
+        article_store: ArticleStore = None,
+        parser: str = "html.parser",
+        parse_workers: int = None,
+        metrics: Metrics = None,
+        result_store: ResultStore = None,
+        error_retries: int = 0,
+        adaptive_timeout: bool = False,
+        hedge: bool = False,
+    ):
         self._for_gatherer = gatherer
         v, d, v_s = (
             self._for_gatherer.verbose,
             self._for_gatherer.domain,
             self._for_gatherer.verify_ssl,
         )
-        super(Scanner, self).__init__(v, d, v_s)
+        super(Scanner, self).__init__(
+            v, d, v_s, sort_query=sort_query, result_store=result_store
+        )
 
         self.all_articles = self._for_gatherer.gather_links
 
         self.timeout = timeout
-
-        self.scan_levels = []
-        self.article_link_dict = {}
-        self._all_results = []
-
-    def add_level(self, scan_level: ScanLevel):
-        if scan_level not in self.scan_levels:
-            self.scan_levels.append(scan_level)
-        else:
-            raise DuplicateLevelException
-
-    def _create_normalized_link_list(self):
-        if self.verbose:
-            print("Normalizing the obtained link dictionary")
-        self._normalized_link_list = []
-
-        for k in self.article_link_dict.keys():
-            # What if the link is still a string and not a list?
-            v = self.article_link_dict.get(k)
-            if isinstance(v, str) and v not in self._normalized_link_list:
-                self._normalized_link_list.append(v)
-            elif isinstance(v, list):
-                [
-                    self._normalized_link_list.append(x)
-                    for x in v
-                    if x not in self._normalized_link_list
-                ]
-            else:
-                raise InvalidLinkEntryException
-
-        if self.verbose:
-            print(
-                f"Done normalizing, we reduced {self.tmp_total_links} links to"
-                f" {len(self._normalized_link_list)} !"
+        self.fetch_workers = fetch_workers
+        self.sessions = sessions if sessions is not None else SessionPool(fetch_workers)
+        if metrics is None:
+            metrics = getattr(gatherer, "metrics", None) or Metrics()
+        self.metrics = metrics
+        if checker is None:
+            checker = LinkChecker(
+                headers=self._for_gatherer.request_headers,
+                verify_ssl=self.verify_ssl,
+                timeout=timeout,
+                workers=scan_workers,
+                sessions=self.sessions,
+                check_mode=check_mode,
+                cache=link_cache,
+                verbose=self.verbose,
+                metrics=self.metrics,
+                error_retries=error_retries,
+                adaptive_timeout=adaptive_timeout,
+                hedge=hedge,
             )
-
-        if self.verbose:
-            print("Cleaning up links we can't query")
-
-        # clean copy
-        clean_list = []
-        # \u2026 grmblgrmbl...
-
-        [
-            clean_list.append(entry.replace("\u2026", ""))
-            for entry in self._normalized_link_list
-            if (entry[:4] == "http" or entry[:5] == "https")
-            and "//localhost" not in entry
-        ]
-        self._normalized_link_list = copy.deepcopy(clean_list)
-
-        if self.verbose:
-            print(f"{len(self._normalized_link_list)} links left after cleaning!")
+        self.checker = checker
+        self.article_store = article_store
+        self.parser = resolve_backend(parser)
+        self.parse_workers = parse_workers
+        # new/changed/unchanged articles seen by the last collect_links
+        self.article_stats = Counter()
 
     def handle_frame(self, search_frame, article, scan_result: ScanResult):
         try:
@@ -251,60 +310,204 @@ class Scanner(PybActivity):
             print(f"We found {len(all_links_in_article)} links.")
         for link in all_links_in_article:
             try:
-                link_href = urllib.parse.unquote(link["href"])
-                if link_href[-1:] in ["?", "\u2026", "#"]:
-                    link_href = link_href[:-1]
+                link_href = clean_href(link["href"])
             except KeyError:
                 # no href... ignore it
                 continue
 
-            tmp_scan_result = copy.deepcopy(scan_result)
-            tmp_scan_result.set_scan_link(link_href)
-            self._all_results.append(tmp_scan_result)
+            link_href = join_href(scan_result.parent_link, link_href)
+            self._record_result(
+                ScanResult(scan_result.parent_text, scan_result.parent_link, link_href)
+            )
+
+    def _article_requests(self):
+        articles = self._for_gatherer.iter_gather_links()
+        for position, article in enumerate(articles):
+            self._article_positions[article.link] = position
+            if self.verbose:
+                print(f"Getting links for article: {article}")
+
+            headers = self._for_gatherer.request_headers
+            if self.article_store is not None:
+                stored = self.article_store.lookup(article.link)
+                if stored is not None:
+                    headers = dict(headers, **stored.validators)
+
+            event = self.metrics.request_started("article_fetch", "GET", article.link)
+            yield ArticleRequest(
+                position,
+                article,
+                event=event,
+                headers=headers,
+                verify=self.verify_ssl,
+                session=self.sessions.for_url(article.link),
+            )
+
+    def _reuse_article_links(self, article: GatherLink, links: list):
+        if self.verbose:
+            print(f"{article.text} is unchanged, reusing {len(links)} links.")
+        self.article_stats["unchanged"] += 1
+        self._record_links(article, len(links), links)
+
+    def _begin_article(self, article: GatherLink, response):
+        """
+            Returns (stored, body_hash) when `article` needs parsing, or None
+            when the article store let us reuse its links as they are.
+        """
+        if self.article_store is None:
+            return None, None
+
+        stored = self.article_store.lookup(article.link)
+        if stored is not None and response.status_code == 304:
+            self._reuse_article_links(article, stored.links)
+            return None
+
+        body_hash = content_hash(response.content, *self._level_salt)
+        if stored is not None and stored.body_hash == body_hash:
+            self._reuse_article_links(article, stored.links)
+            self._store_article(
+                article, response, body_hash, stored.frame_hash, stored.links
+            )
+            return None
+        return stored, body_hash
+
+    def _finish_article(self, article, response, stored, body_hash, parsed):
+        anchors, links, frame_hash = parsed
+        if stored is not None and stored.frame_hash == frame_hash:
+            links = stored.links
+            self._reuse_article_links(article, links)
+        else:
+            if self.article_store is not None:
+                self.article_stats["new" if stored is None else "changed"] += 1
+            self._record_links(article, anchors, links)
+
+        if self.article_store is not None:
+            self._store_article(article, response, body_hash, frame_hash, links)
+
+    def _store_article(self, article, response, body_hash, frame_hash, links):
+        self.article_store.store(
+            article.link,
+            body_hash,
+            frame_hash,
+            links,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    def _parse_article(self, response, pool=None):
+        salt = self._level_salt if self.article_store is not None else None
+        if pool is None:
+            return extract_links(response.text, self._level_specs, self.parser, salt)
+        # Bytes travel to the worker cheaper than text, decode them there the
+        # same way requests would have.
+        return pool.submit(
+            extract_links,
+            response.content,
+            self._level_specs,
+            self.parser,
+            salt,
+            response.encoding or response.apparent_encoding,
+        )
 
-            if article.text in self.article_link_dict.keys():
+    def _collect_article(self, article: GatherLink, response):
+        """Record the links of a fetched article, parsing it in this process."""
+        pending = self._begin_article(article, response)
+        if pending is not None:
+            with self.metrics.phase("parse"):
+                parsed = self._parse_article(response)
+            self._finish_article(article, response, *pending, parsed)
+
+    def _start_parse_pool(self):
+        if not self.parse_workers:
+            return None
+        # spawn, not fork: forking a process that runs gevent is not safe.
+        return concurrent.futures.ProcessPoolExecutor(
+            self.parse_workers, mp_context=multiprocessing.get_context("spawn")
+        )
 
-                if isinstance(self.article_link_dict[article.text], str):
-                    self.article_link_dict[article.text] = [
-                        self.article_link_dict[article.text],
-                        link_href,
-                    ]
-                else:
-                    self.article_link_dict[article.text].append(link_href)
-            else:
-                self.article_link_dict[article.text] = link_href
+    def _harvest_parsed(self, parsing: list, chunks: list, wait: bool = False):
+        if wait and parsing:
+            # Wait on a native thread so the gevent hub keeps running.
+            gevent.get_hub().threadpool.apply(
+                concurrent.futures.wait, ([job[-1] for job in parsing],)
+            )
+        still_parsing = []
+        for position, article, response, stored, body_hash, future in parsing:
+            if not future.done():
+                still_parsing.append(
+                    (position, article, response, stored, body_hash, future)
+                )
+                continue
+            first_result = len(self._all_results)
+            self._finish_article(
+                article, response, stored, body_hash, future.result()
+            )
+            chunks.append((position, self._all_results[first_result:]))
+        parsing[:] = still_parsing
 
     def collect_links(self):
         if len(self.scan_levels) > 0:
-            for article in self.all_articles:
-                if self.verbose:
-                    print(f"Getting links for article: {article}")
-
-                s = ScanResult(article.text, article.link)
-                with requests.Session() as _sess:
-                    article_resp = _sess.get(
-                        url=article.link,
-                        headers=self._for_gatherer.request_headers,
-                        verify=self.verify_ssl,
-                    )
-                article_body = article_resp.text
-                soup = BeautifulSoup(article_body, "html.parser")
-                for scan_level in self.scan_levels:
+            chunks = []
+            parsing = []
+            self.article_stats = Counter()
+            self.fetched_pages = {}
+            if self.result_store is not None:
+                self.result_store.clear()
+            pool = self._start_parse_pool()
+            fetched = imap_requests(self._article_requests(), size=self.fetch_workers)
+            try:
+                # A lazy gatherer fetches index pages while we wait here.
+                articles = self.metrics.timed(
+                    "article_fetch", fetched, excluding=("index_fetch",)
+                )
+                for request in articles:
+                    if request.response is None:
+                        self.metrics.request_finished(
+                            request.event, exception=request.exception
+                        )
+                        raise request.exception
 
-                    count_helper = soup.find_all(
-                        scan_level.html_tag,
-                        {scan_level.html_attrib: scan_level.html_attrib_val},
+                    article, response = request.article, request.response
+                    self.metrics.request_finished(
+                        request.event, response, size=len(response.content)
                     )
-
-                    if len(count_helper) > 0:
-                        for frame in count_helper:
-                            self.handle_frame(frame, article, s)
+                    hist = response.history
+                    self._record_page(
+                        article,
+                        hist[0].status_code if len(hist) > 0 else response.status_code,
+                        response.url,
+                    )
+                    first_result = len(self._all_results)
+                    pending = None
+                    if pool is None:
+                        self._collect_article(article, response)
                     else:
-                        search_frame = soup.find(
-                            scan_level.html_tag,
-                            {scan_level.html_attrib: scan_level.html_attrib_val},
+                        pending = self._begin_article(article, response)
+                    if pending is not None:
+                        future = self._parse_article(response, pool)
+                        parsing.append(
+                            (request.position, article, response, *pending, future)
                         )
-                        self.handle_frame(search_frame, article, s)
+                    else:
+                        chunks.append(
+                            (request.position, self._all_results[first_result:])
+                        )
+                    self._harvest_parsed(parsing, chunks)
+                with self.metrics.phase("parse"):
+                    self._harvest_parsed(parsing, chunks, wait=True)
+            finally:
+                if pool is not None:
+                    for job in parsing:
+                        job[-1].cancel()
+                    pool.shutdown(wait=True)
+            self._restore_article_order(chunks)
+            if self.result_store is not None:
+                self.result_store.flush()
+
+            if self.article_store is not None:
+                self.article_store.flush()
+                if self.verbose:
+                    print(f"Articles: {dict(self.article_stats)}")
 
             self._create_normalized_link_list()
 
@@ -312,70 +515,43 @@ class Scanner(PybActivity):
             raise NoLinksInScanLevel
 
     def link_iterator(self):
-        for u in self._normalized_link_list:
-            yield grequests.get(
-                url=u,
-                headers=self._for_gatherer.request_headers,
-                verify=self.verify_ssl,
-                timeout=self.timeout,
-            )
+        return self.checker.request_iterator(self._normalized_link_list)
+
+    def iter_scan(self):
+        """
+            Check every normalized link and yield the ScanResults of a link as
+            soon as its request completes, in completion order. Links to
+            articles fetched by collect_links come first, without a request.
+        """
+        fetched, to_check = self._split_fetched()
+        try:
+            for outcome in fetched:
+                yield from self._apply_outcome(outcome)
+            for outcome in self.checker.iter_outcomes(to_check):
+                yield from self._apply_outcome(outcome)
+        finally:
+            self._flush_results()
 
     def scan_links(self):
         if self.verbose:
             print("Generating request set")
 
-        request_set = (u for u in self.link_iterator())
-
         print("Firing requests and waiting for them to come back.")
-        all_results = grequests.map(
-            request_set, exception_handler=self.request_exception_handler
-        )
+        for _ in self.iter_scan():
+            pass
 
-        for result in all_results:
-            if result is not None:
-                # VERY Interesting :-)
-                hist = result.history
-                if len(hist) > 0:
-                    # Where does this link occur in our scan results?
-                    indices = [
-                        i
-                        for i, x in enumerate(self._all_results)
-                        if x.scan_link == urllib.parse.unquote(hist[0].url)
-                    ]
-
-                    for idx in indices:
-                        self._all_results[idx].set_result_by_status_code(
-                            hist[0].status_code, urllib.parse.unquote(result.url)
-                        )
-                else:
-                    indices = [
-                        i
-                        for i, x in enumerate(self._all_results)
-                        if x.scan_link == urllib.parse.unquote(result.url)
-                    ]
-                    for idx in indices:
-                        self._all_results[idx].set_result_by_status_code(
-                            result.status_code, urllib.parse.unquote(result.url)
-                        )
+        if self.verbose:
+            print(f"Done scanning: {self.checker.stats}")
 
     def request_exception_handler(self, request, exception):
-        indices = [
-            i
-            for i, x in enumerate(self._all_results)
-            if x.scan_link == urllib.parse.unquote(request.url)
-        ]
         # Response object will be none so we need to add it to dict here
-        for idx in indices:
-            self._all_results[idx].set_result_by_exception(exception)
-
-    @property
-    def get_normalized_link_list(self):
-        return self._normalized_link_list
-
-    @property
-    def get_article_link_dict(self):
-        return self.article_link_dict
-
-    @property
-    def all_results(self):
-        return self._all_results
+        if self.result_store is not None:
+            scan_result = ScanResult("", "")
+            scan_result.set_result_by_exception(exception)
+            canonical_link = self.normalizer.canonicalize(
+                urllib.parse.unquote(request.url)
+            )
+            self._store_result(canonical_link, scan_result)
+            return
+        for scan_result in self._results_for(request.url):
+            scan_result.set_result_by_exception(exception)
@@ -0,0 +1,215 @@
+"""
+Streaming exports of scan results and diffs between two runs.
+
+    export(scanner.all_results, "tonight.jsonl")
+    changes = diff_runs(read_export("last_night.jsonl"), read_export("tonight.jsonl"))
+
+Exports are written one result at a time, so with a ResultStore a scan of any
+size is exported in constant memory. Three formats:
+
+- jsonl: one JSON object per link occurrence,
+- csv: the same fields as CSV with a header row,
+- columns: one JSON line per article holding its links column by column, so
+  the article is written once instead of once per link. The results must come
+  grouped by article, as all_results is ordered; iter_scan() yields them in
+  completion order, collect those into all_results before exporting.
+
+From the command line, to keep only what changed since the previous run:
+
+    python reports.py diff last_night.jsonl tonight.jsonl --output delta.jsonl
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+FIELDS = ("article", "article_link", "link", "status_code", "exception", "result")
+COLUMN_FIELDS = FIELDS[2:]
+
+FORMATS = ("jsonl", "csv", "columns")
+
+
+def guess_format(path: str) -> str:
+    if path.endswith(".columns.jsonl"):
+        return "columns"
+    if path.endswith(".jsonl"):
+        return "jsonl"
+    if path.endswith(".csv"):
+        return "csv"
+    raise ValueError(f"Can't tell the export format of {path}, pass fmt=")
+
+
+def as_record(scan_result) -> dict:
+    return {
+        "article": scan_result.parent_text,
+        "article_link": scan_result.parent_link,
+        "link": scan_result.scan_link,
+        "status_code": scan_result.status_code,
+        "exception": bool(scan_result.threw_exception),
+        "result": scan_result.result_text,
+    }
+
+
+class JSONLinesExporter(object):
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write_all(self, records):
+        for record in records:
+            self.stream.write(json.dumps(record))
+            self.stream.write("\n")
+
+
+class CSVExporter(object):
+    def __init__(self, stream):
+        self.writer = csv.DictWriter(stream, FIELDS)
+
+    def write_all(self, records):
+        self.writer.writeheader()
+        self.writer.writerows(records)
+
+
+class ColumnsExporter(object):
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write_all(self, records):
+        articles = itertools.groupby(
+            records, key=lambda record: (record["article"], record["article_link"])
+        )
+        written = set()
+        for (article, article_link), rows in articles:
+            if article_link in written:
+                raise ValueError(
+                    f"{article_link} came back after other articles, a columns"
+                    " export needs the results grouped by article (all_results)"
+                )
+            written.add(article_link)
+            block = {"article": article, "article_link": article_link}
+            block.update((field, []) for field in COLUMN_FIELDS)
+            for row in rows:
+                for field in COLUMN_FIELDS:
+                    block[field].append(row[field])
+            self.stream.write(json.dumps(block))
+            self.stream.write("\n")
+
+
+EXPORTERS = {
+    "jsonl": JSONLinesExporter,
+    "csv": CSVExporter,
+    "columns": ColumnsExporter,
+}
+
+
+def export(results, path: str, fmt: str = None):
+    """Write ScanResults (any iterable, e.g. a streaming all_results) to `path`."""
+    fmt = fmt or guess_format(path)
+    with open(path, "w", newline="") as stream:
+        EXPORTERS[fmt](stream).write_all(as_record(r) for r in results)
+
+
+def _read_csv(stream):
+    for row in csv.DictReader(stream):
+        row["status_code"] = int(row["status_code"])
+        row["exception"] = row["exception"] == "True"
+        yield row
+
+
+def _read_columns(stream):
+    for line in stream:
+        block = json.loads(line)
+        for values in zip(*(block[field] for field in COLUMN_FIELDS)):
+            record = dict(zip(COLUMN_FIELDS, values))
+            record.update(article=block["article"], article_link=block["article_link"])
+            yield record
+
+
+def read_export(path: str, fmt: str = None):
+    """Stream the records of an export back, whatever its format."""
+    fmt = fmt or guess_format(path)
+    with open(path, newline="") as stream:
+        if fmt == "csv":
+            yield from _read_csv(stream)
+        elif fmt == "columns":
+            yield from _read_columns(stream)
+        else:
+            yield from (json.loads(line) for line in stream)
+
+
+def link_state(record: dict) -> str:
+    """"broken", "redirected", "ok", or None for a link that wasn't checked."""
+    status_code = record["status_code"]
+    if record["exception"] or status_code >= 400:
+        return "broken"
+    if 300 <= status_code < 400:
+        return "redirected"
+    if 200 <= status_code < 300:
+        return "ok"
+    return None
+
+
+def diff_runs(previous, current):
+    """
+        Yield the links of `current` whose state is news compared to
+        `previous`, both iterables of export records. Each change is a record
+        with "change" ("newly_broken", "fixed", "newly_redirected" or
+        "redirect_changed", when the link now redirects somewhere else) and
+        the previous result added. Links are matched per article, a link that
+        is new in the current run counts as newly broken or redirected.
+
+        Only the previous run's states are held in memory, one small tuple per
+        link occurrence.
+    """
+    known = {}
+    for record in previous:
+        known[(record["article_link"], record["link"])] = (
+            link_state(record),
+            record["result"],
+        )
+
+    for record in current:
+        state = link_state(record)
+        previous_state, previous_result = known.get(
+            (record["article_link"], record["link"]), (None, None)
+        )
+        if state == previous_state == "redirected":
+            # The result names where the link redirects to.
+            if record["result"] != previous_result:
+                yield dict(
+                    record, change="redirect_changed", previous_result=previous_result
+                )
+            continue
+        if state == previous_state or state is None:
+            continue
+        if state == "broken":
+            change = "newly_broken"
+        elif previous_state == "broken":
+            change = "fixed"
+        elif state == "redirected":
+            change = "newly_redirected"
+        else:
+            continue
+        yield dict(record, change=change, previous_result=previous_result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two scan exports.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    diff = commands.add_parser("diff", help="only what changed since last run")
+    diff.add_argument("previous")
+    diff.add_argument("current")
+    diff.add_argument("--output", help="write the changes as JSON Lines here")
+    args = parser.parse_args(argv)
+
+    changes = diff_runs(read_export(args.previous), read_export(args.current))
+    stream = open(args.output, "w") if args.output else sys.stdout
+    try:
+        JSONLinesExporter(stream).write_all(changes)
+    finally:
+        if args.output:
+            stream.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import itertools
+import sqlite3
+
+RESULT_COLUMNS = (
+    "parent_text",
+    "parent_link",
+    "scan_link",
+    "status_code",
+    "threw_exception",
+    "result_text",
+    "scan_done",
+)
+
+
+class ResultStore(object):
+    """
+        SQLite storage for a Scanner's link occurrences, for sites too big to
+        keep one ScanResult per anchor in memory.
+
+        Rows are written as articles are collected and read back with
+        streaming queries: all of them in gatherer order, the links grouped
+        per article, or the occurrences of one canonical URL (indexed, that's
+        how check outcomes are applied). Only the rows being looked at are in
+        memory at any time.
+
+        Use a file path for huge scans, ":memory:" keeps the database in RAM.
+        Check results are committed every `flush_every` outcomes and at the
+        end of every scan, so an interrupted scan keeps what it found.
+    """
+
+    def __init__(self, path: str = ":memory:", flush_every: int = 1000):
+        self.path = path
+        self.flush_every = flush_every
+        self._unflushed = 0
+        # The AsyncScanner uses it from a worker thread, one call at a time.
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " id INTEGER PRIMARY KEY,"
+            " position INTEGER NOT NULL,"
+            " canonical TEXT NOT NULL,"
+            " parent_text TEXT NOT NULL,"
+            " parent_link TEXT NOT NULL,"
+            " scan_link TEXT NOT NULL,"
+            " status_code INTEGER NOT NULL DEFAULT 0,"
+            " threw_exception INTEGER NOT NULL DEFAULT 0,"
+            " result_text TEXT NOT NULL DEFAULT '',"
+            " scan_done INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS results_canonical ON results (canonical)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS results_article ON results (position, id)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS results_parent ON results (parent_link)"
+        )
+
+    def clear(self):
+        self._db.execute("DELETE FROM results")
+
+    def add(self, position: int, canonical: str, parent_text, parent_link, scan_link):
+        self._db.execute(
+            "INSERT INTO results (position, canonical, parent_text, parent_link,"
+            " scan_link) VALUES (?, ?, ?, ?, ?)",
+            (position, canonical, parent_text, parent_link, scan_link),
+        )
+
+    def set_result(
+        self, canonical: str, status_code, threw_exception, result_text
+    ) -> list:
+        """Record the outcome of `canonical` on every occurrence, return them."""
+        self._db.execute(
+            "UPDATE results SET status_code = ?, threw_exception = ?,"
+            " result_text = ?, scan_done = 1 WHERE canonical = ?",
+            (status_code, threw_exception, result_text, canonical),
+        )
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+        return self.occurrences(canonical)
+
+    def occurrences(self, canonical: str) -> list:
+        return self._db.execute(
+            f"SELECT {', '.join(RESULT_COLUMNS)} FROM results"
+            " WHERE canonical = ? ORDER BY position, id",
+            (canonical,),
+        ).fetchall()
+
+    def iter_rows(self):
+        """Every occurrence in gatherer order, one row at a time."""
+        yield from self._db.execute(
+            f"SELECT {', '.join(RESULT_COLUMNS)} FROM results ORDER BY position, id"
+        )
+
+    def iter_scan_links(self):
+        for (scan_link,) in self._db.execute(
+            "SELECT scan_link FROM results ORDER BY position, id"
+        ):
+            yield scan_link
+
+    def iter_links_by_article(self):
+        """(parent_text, [scan_link, ...]) per article, in gatherer order."""
+        rows = self._db.execute(
+            "SELECT parent_text, position, scan_link FROM results"
+            " ORDER BY position, id"
+        )
+        for (parent_text, _), group in itertools.groupby(
+            rows, key=lambda row: row[:2]
+        ):
+            yield parent_text, [scan_link for _, _, scan_link in group]
+
+    def flush(self):
+        self._db.commit()
+        self._unflushed = 0
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
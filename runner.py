@@ -70,12 +70,14 @@ def pybit_runner():
     # Add level
     s.add_level(sl_1)
 
-    # Collect and scan links
+    # Collect links, then report every link as soon as its check comes back
     s.collect_links()
-    s.scan_links()
-
-    # Now we can print the scan report.
-    # s.print_basic_scan_report()
+    for scanresult in s.iter_scan():
+        if scanresult.threw_exception or scanresult.status_code >= 400:
+            print(
+                f"{scanresult.parent_text}: {scanresult.scan_link}"
+                f" => {scanresult.result_text}"
+            )
 
 
 if __name__ == "__main__":
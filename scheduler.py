@@ -0,0 +1,275 @@
+import random
+import time
+from collections import Counter, deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# Statuses that mean "slow down" rather than "broken".
+RETRY_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value, now: float = None):
+    """
+        Turn a Retry-After header (delta-seconds or an HTTP date) into a number
+        of seconds to wait, or None when it is missing or unreadable.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, retry_at - now)
+
+
+def host_of(url: str) -> str:
+    """
+        The lowercased host[:port] of `url`, or `url` itself when urllib
+        can't parse it, so a malformed link still gets a host of its own.
+    """
+    try:
+        return urlparse(url).netloc.lower()
+    except ValueError:
+        return url
+
+
+class LinkTask(object):
+    __slots__ = ("url", "host", "method", "attempt", "not_before")
+
+    def __init__(self, url: str, method: str = "GET"):
+        self.url = url
+        self.host = host_of(url)
+        self.method = method
+        self.attempt = 0
+        self.not_before = 0.0
+
+    def __str__(self):
+        return f"{self.method} {self.url} (attempt {self.attempt + 1})"
+
+
+class HostScheduler(object):
+    """
+        Decides which queued link may be requested next.
+
+        Every host gets at most `max_per_host` requests in flight and, when
+        `requests_per_second` is set, no more than that many starts per second.
+        Hosts are served round-robin so one big host doesn't starve the rest.
+        A link answered with 429/503 can be handed back through retry(); it is
+        requeued after the server's Retry-After (or an exponential backoff)
+        and the whole host is held back until then. retry(hold_host=False)
+        only delays that link, for failures that say nothing about the host's
+        load, like a dropped connection. With `jitter` the backoff
+        is shortened by a random fraction of up to that much, so links that
+        failed together don't all come back at the same moment.
+
+        The scheduler does no I/O and never sleeps, the caller does the waiting.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = 4,
+        requests_per_second: float = None,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        jitter: float = 0.0,
+        clock=time.monotonic,
+        rng=random.random,
+    ):
+        self.max_per_host = max_per_host
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng
+
+        self._queues = {}
+        self._rotation = deque()
+        self._in_flight = Counter()
+        self._host_available_at = {}
+        self.retries = 0
+
+    def add(self, url: str, method: str = "GET") -> LinkTask:
+        task = LinkTask(url, method)
+        self._enqueue(task)
+        return task
+
+    def _enqueue(self, task: LinkTask, front: bool = False):
+        queue = self._queues.get(task.host)
+        if queue is None:
+            queue = self._queues[task.host] = deque()
+            self._rotation.append(task.host)
+        if front:
+            queue.appendleft(task)
+        else:
+            queue.append(task)
+
+    @property
+    def finished(self) -> bool:
+        return not self._queues and not sum(self._in_flight.values())
+
+    @property
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def next_ready(self):
+        """
+            Returns (task, None) when a task may start now. Otherwise returns
+            (None, wait) with the seconds until the earliest held back host
+            opens up, or (None, None) when only a completion can unblock us.
+        """
+        now = self.clock()
+        wait = None
+        for _ in range(len(self._rotation)):
+            host = self._rotation[0]
+            self._rotation.rotate(-1)
+            if self._in_flight[host] >= self.max_per_host:
+                continue
+
+            queue = self._queues[host]
+            available_at = max(
+                self._host_available_at.get(host, 0.0), queue[0].not_before
+            )
+            if available_at > now:
+                delay = available_at - now
+                wait = delay if wait is None else min(wait, delay)
+                continue
+
+            task = queue.popleft()
+            if not queue:
+                del self._queues[host]
+                self._rotation.remove(host)
+            self._in_flight[host] += 1
+            if self.requests_per_second:
+                self._host_available_at[host] = now + 1.0 / self.requests_per_second
+            return task, None
+        return None, wait
+
+    def complete(self, task: LinkTask):
+        self._in_flight[task.host] -= 1
+        if not self._in_flight[task.host]:
+            del self._in_flight[task.host]
+
+    def retry(
+        self, task: LinkTask, retry_after: float = None, hold_host: bool = True
+    ) -> bool:
+        """
+            Finish `task` and queue it again for a later attempt. Returns False,
+            without touching the task, once it is out of retries or the server
+            asks us to wait longer than max_backoff. Without `hold_host` the
+            task goes to the back of its host's queue and the host's other
+            links carry on meanwhile.
+        """
+        if task.attempt >= self.max_retries:
+            return False
+
+        if retry_after is None:
+            delay = min(self.max_backoff, self.backoff * 2 ** task.attempt)
+            delay *= 1.0 - self.jitter * self.rng()
+        elif retry_after > self.max_backoff:
+            return False
+        else:
+            delay = retry_after
+
+        task.attempt += 1
+        self.requeue(task, delay, front=hold_host)
+        if hold_host:
+            held_until = self._host_available_at.get(task.host, 0.0)
+            self._host_available_at[task.host] = max(held_until, task.not_before)
+        self.retries += 1
+        return True
+
+    def requeue(self, task: LinkTask, delay: float = 0.0, front: bool = True):
+        """Finish `task` and put it back at the front (or back) of its host's queue."""
+        self.complete(task)
+        task.not_before = self.clock() + delay
+        self._enqueue(task, front=front)
+
+
+class HostCircuitBreaker(object):
+    """
+        Counts consecutive connection failures per host. Once a host has failed
+        `threshold` times in a row its circuit opens and stays open: the rest
+        of its links can be answered with the same error without a request.
+        A successful response resets the count.
+    """
+
+    def __init__(self, threshold: int = 3):
+        self.threshold = threshold
+        self._failures = Counter()
+        # host -> the exception that opened its circuit
+        self._opened_by = {}
+
+    def record_success(self, host: str):
+        self._failures.pop(host, None)
+
+    def record_failure(self, host: str, exception: Exception):
+        self._failures[host] += 1
+        if self._failures[host] >= self.threshold:
+            self.trip(host, exception)
+
+    def trip(self, host: str, exception: Exception):
+        self._opened_by.setdefault(host, exception)
+
+    def opened_by(self, host: str):
+        """The exception that opened the circuit of `host`, None when closed."""
+        return self._opened_by.get(host)
+
+    @property
+    def open_hosts(self) -> list:
+        return list(self._opened_by)
+
+
+class HostLatency(object):
+    """
+        The last `window` response times of every host, to size timeouts and
+        hedging delays after how fast a host really answers instead of one
+        fixed timeout for all of them.
+
+        Until a host has `min_samples` observations nothing is known about it
+        and the caller's defaults apply.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        min_samples: int = 10,
+        multiplier: float = 3.0,
+        min_timeout: float = 0.5,
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self._samples = {}
+
+    def observe(self, host: str, seconds: float):
+        samples = self._samples.get(host)
+        if samples is None:
+            samples = self._samples[host] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, host: str, fraction: float):
+        """The `fraction` percentile of the latency of `host`, None if unknown."""
+        samples = self._samples.get(host)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[round(fraction * (len(ordered) - 1))]
+
+    def timeout(self, host: str, default: float) -> float:
+        """
+            `multiplier` times the p99 latency of `host`, never below
+            `min_timeout` nor above `default`, which is also the answer for a
+            host we don't know yet.
+        """
+        p99 = self.percentile(host, 0.99)
+        if p99 is None:
+            return default
+        return min(default, max(self.min_timeout, p99 * self.multiplier))
@@ -0,0 +1,85 @@
+import requests
+from gevent.lock import BoundedSemaphore
+from gevent.pool import Pool
+
+from dns_cache import CachedDNSAdapter, DNSCache
+from scheduler import host_of
+
+
+class BudgetedSession(requests.Session):
+    """Session whose requests wait for a slot in a budget shared with others."""
+
+    def __init__(self, budget: BoundedSemaphore):
+        super(BudgetedSession, self).__init__()
+        self.budget = budget
+
+    def request(self, *args, **kwargs):
+        # request(), not send(): send() runs again for every redirect hop.
+        with self.budget:
+            return super(BudgetedSession, self).request(*args, **kwargs)
+
+
+class SessionPool(object):
+    """
+        Hands out one keep-alive requests.Session per host.
+
+        Every request to the same host goes through the same Session, so its
+        connections are pooled and reused instead of being torn down after each
+        article or link. With a `budget` no more than that many requests are in
+        flight over all hosts together, however many crawls share the pool.
+        New connections take their addresses from `dns_cache`, so a host is
+        looked up once per TTL rather than once per connection.
+    """
+
+    def __init__(
+        self, pool_size: int = 10, budget: int = None, dns_cache: DNSCache = None
+    ):
+        self.pool_size = pool_size
+        self.budget = BoundedSemaphore(budget) if budget else None
+        self.dns_cache = dns_cache if dns_cache is not None else DNSCache()
+        self._sessions = {}
+
+    def for_url(self, url: str) -> requests.Session:
+        host = host_of(url)
+        session = self._sessions.get(host)
+        if session is None:
+            if self.budget is None:
+                session = requests.Session()
+            else:
+                session = BudgetedSession(self.budget)
+            adapter = CachedDNSAdapter(
+                self.dns_cache, pool_connections=1, pool_maxsize=self.pool_size
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._sessions[host] = session
+        return session
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def imap_requests(async_requests, size: int = None, finish=None):
+    """
+        Send grequests.AsyncRequest objects with at most `size` in flight and
+        yield every request as soon as it completes (completion order).
+
+        Unlike grequests.imap the request itself is yielded, so callers keep
+        whatever they attached to it and can inspect .response or .exception.
+        When `finish` is given it runs on the request inside the worker and its
+        return value is yielded instead, e.g. to drop the response body before
+        it ever waits in the result queue.
+    """
+
+    def send(request):
+        request.send()
+        return finish(request) if finish is not None else request
+
+    pool = Pool(size)
+    for result in pool.imap_unordered(send, async_requests):
+        yield result
@@ -0,0 +1,286 @@
+"""
+Check the links of one scan on several processes or machines.
+
+    write_manifest(scanner, "manifest.jsonl", shards=4)
+
+after collect_links writes a work manifest: every normalized link with the
+shard it belongs to, plus every link occurrence to rebuild the results from.
+Links are sharded by host, so one host is only ever checked by one worker and
+its politeness limits still hold. Each worker checks its shard and writes a
+partial result file:
+
+    python sharding.py check manifest.jsonl --shard 0 --output part-0.jsonl
+
+and the partial files are merged back into the full set of results, in
+gatherer order and grouped by article, in any of the reports formats:
+
+    python sharding.py merge manifest.jsonl part-*.jsonl --output results.jsonl
+
+The merge only reads files, it gives the same output for the same files
+however often it runs and whatever order they are listed in. On one machine
+
+    python sharding.py run manifest.jsonl --output results.jsonl
+
+starts a worker process per shard and merges what they wrote.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from checker import LinkChecker
+from core import ScanBase, ScanResult
+from exceptions import InvalidShardFileException
+from reports import export
+from scheduler import host_of
+
+MANIFEST_VERSION = 1
+
+
+def shard_of(url: str, shards: int) -> int:
+    """The shard of `url`, the same in every process: by host, not hash()."""
+    host = host_of(url).encode()
+    return int.from_bytes(hashlib.sha1(host).digest()[:8], "big") % shards
+
+
+def result_record(url: str, outcome) -> dict:
+    scan_result = ScanResult("", "")
+    ScanBase._set_outcome(scan_result, outcome)
+    return {
+        "url": url,
+        "status_code": scan_result.status_code,
+        "exception": scan_result.threw_exception,
+        "result": scan_result.result_text,
+    }
+
+
+def _manifest_id(urls, shards: int) -> str:
+    digest = hashlib.sha1(str(shards).encode())
+    for url in urls:
+        digest.update(b"\n" + url.encode())
+    return digest.hexdigest()
+
+
+def write_manifest(scanner, path: str, shards: int):
+    """
+        Write the work manifest of a collected `scanner`. Links to articles
+        fetched while collecting carry their result already and are left out
+        of the shards.
+    """
+    urls = scanner.get_normalized_link_list
+    checker = scanner.checker
+    header = {
+        "manifest": MANIFEST_VERSION,
+        "id": _manifest_id(urls, shards),
+        "shards": shards,
+        "verify_ssl": scanner.verify_ssl,
+        "timeout": checker.timeout,
+        "check_mode": checker.check_mode,
+    }
+    with open(path, "w") as manifest:
+        manifest.write(json.dumps(header) + "\n")
+        for url in urls:
+            record = {"type": "link", "url": url, "shard": shard_of(url, shards)}
+            outcome = scanner.fetched_pages.get(url)
+            if outcome is not None:
+                record["result"] = result_record(url, outcome)
+            manifest.write(json.dumps(record) + "\n")
+        for scan_result in scanner.all_results:
+            record = {
+                "type": "occurrence",
+                "article": scan_result.parent_text,
+                "article_link": scan_result.parent_link,
+                "link": scan_result.scan_link,
+                "url": scanner.normalizer.canonicalize(scan_result.scan_link),
+            }
+            manifest.write(json.dumps(record) + "\n")
+
+
+def _read_jsonl(path: str):
+    with open(path) as stream:
+        header = json.loads(next(stream))
+        yield header
+        for line in stream:
+            yield json.loads(line)
+
+
+def read_manifest(path: str):
+    """(header, records) of a manifest, the records are streamed."""
+    records = _read_jsonl(path)
+    header = next(records)
+    if header.get("manifest") != MANIFEST_VERSION:
+        raise InvalidShardFileException(path, "not a work manifest")
+    return header, records
+
+
+def _write_atomically(path: str, lines):
+    # A worker that dies halfway leaves no partial file to be merged.
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w") as stream:
+            for line in lines:
+                stream.write(json.dumps(line) + "\n")
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def check_shard(manifest_path: str, shard: int, output: str, workers: int = None):
+    """Check the links of `shard` and write them to the partial file `output`."""
+    header, records = read_manifest(manifest_path)
+    if not 0 <= shard < header["shards"]:
+        raise InvalidShardFileException(manifest_path, f"has no shard {shard}")
+    urls = [
+        record["url"]
+        for record in records
+        if record["type"] == "link"
+        and record["shard"] == shard
+        and "result" not in record
+    ]
+
+    checker = LinkChecker(
+        verify_ssl=header["verify_ssl"],
+        timeout=header["timeout"],
+        check_mode=header["check_mode"],
+        workers=workers,
+    )
+    results = (
+        result_record(outcome.url, outcome)
+        for outcome in checker.iter_outcomes(urls)
+    )
+    part_header = {"manifest": header["id"], "shard": shard, "links": len(urls)}
+    _write_atomically(output, _with_header(part_header, results))
+    return checker.stats
+
+
+def _with_header(header: dict, records):
+    yield header
+    yield from records
+
+
+def _read_results(header: dict, partial_paths):
+    """url -> result record, from the partial files of every shard."""
+    by_shard = {}
+    for path in sorted(partial_paths):
+        records = _read_jsonl(path)
+        part_header = next(records)
+        if part_header.get("manifest") != header["id"]:
+            raise InvalidShardFileException(path, "written for another manifest")
+        # The same shard checked twice: keep the first file in path order.
+        if part_header["shard"] not in by_shard:
+            by_shard[part_header["shard"]] = list(records)
+
+    missing = sorted(set(range(header["shards"])) - set(by_shard))
+    if missing:
+        raise InvalidShardFileException(
+            ", ".join(sorted(partial_paths)) or "no files", f"shards {missing} missing"
+        )
+
+    results = {}
+    for shard in sorted(by_shard):
+        for record in by_shard[shard]:
+            results.setdefault(record["url"], record)
+    return results
+
+
+def merge(manifest_path: str, partial_paths):
+    """
+        Yield a ScanResult per link occurrence of the manifest, in gatherer
+        order, with the result its shard (or the collect phase) found.
+        Occurrences of links that weren't checked, like mailto:, stay
+        unchecked.
+    """
+    header, _ = read_manifest(manifest_path)
+    results = _read_results(header, partial_paths)
+
+    _, records = read_manifest(manifest_path)
+    for record in records:
+        if record["type"] == "link":
+            if "result" in record:
+                results.setdefault(record["url"], record["result"])
+            continue
+
+        scan_result = ScanResult(
+            record["article"], record["article_link"], record["link"]
+        )
+        result = results.get(record["url"])
+        if result is not None:
+            scan_result.status_code = result["status_code"]
+            scan_result.threw_exception = result["exception"]
+            scan_result.result_text = result["result"]
+            scan_result.scan_done = True
+        yield scan_result
+
+
+def run_local(manifest_path: str, output_dir: str, processes: int = None) -> list:
+    """
+        Check every shard in its own worker process on this machine, at most
+        `processes` at a time, and return the partial files they wrote.
+    """
+    header, _ = read_manifest(manifest_path)
+    os.makedirs(output_dir, exist_ok=True)
+    shards = list(range(header["shards"]))
+    processes = processes or len(shards)
+    paths = []
+    for first in range(0, len(shards), processes):
+        running = []
+        for shard in shards[first : first + processes]:
+            path = os.path.join(output_dir, f"part-{shard}.jsonl")
+            command = [
+                sys.executable,
+                os.path.abspath(__file__),
+                "check",
+                manifest_path,
+                "--shard",
+                str(shard),
+                "--output",
+                path,
+            ]
+            running.append(subprocess.Popen(command))
+            paths.append(path)
+        for process in running:
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check links shard by shard.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    check = commands.add_parser("check", help="check one shard of a manifest")
+    check.add_argument("manifest")
+    check.add_argument("--shard", type=int, required=True)
+    check.add_argument("--output", required=True, help="partial result file")
+    check.add_argument("--workers", type=int, default=None)
+
+    merged = commands.add_parser("merge", help="merge partial result files")
+    merged.add_argument("manifest")
+    merged.add_argument("partials", nargs="+")
+    merged.add_argument("--output", required=True, help="jsonl, csv or columns")
+
+    run = commands.add_parser("run", help="check every shard locally and merge")
+    run.add_argument("manifest")
+    run.add_argument("--output", required=True)
+    run.add_argument("--parts", default="parts", help="partial file directory")
+    run.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "check":
+        stats = check_shard(args.manifest, args.shard, args.output, args.workers)
+        print(f"shard {args.shard}: {stats}")
+        return
+    if args.command == "run":
+        partials = run_local(args.manifest, args.parts, args.processes)
+    else:
+        partials = args.partials
+    export(merge(args.manifest, partials), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import gzip
+import re
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime, timezone
+
+import requests
+
+from core import GatherBase
+from exceptions import InvalidSitemapException, InvalidTargetException
+from metrics import Metrics
+from sessions import SessionPool
+
+GZIP_MAGIC = b"\x1f\x8b"
+CHUNK_SIZE = 64 * 1024
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_lastmod(value):
+    """
+        Turn a sitemap <lastmod> (W3C datetime, a date or a full timestamp)
+        into an aware datetime, or None when it is missing or unreadable.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+class _Replayed(object):
+    """A stream with the bytes already read from it put back in front."""
+
+    def __init__(self, head: bytes, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        head, self.head = self.head, b""
+        if size is None or size < 0:
+            return head + self.stream.read()
+        if len(head) >= size:
+            self.head = head[size:]
+            return head[:size]
+        return head + self.stream.read(size - len(head))
+
+
+def _as_moment(since):
+    if since is None or isinstance(since, str):
+        return parse_lastmod(since)
+    if not isinstance(since, datetime):
+        since = datetime(since.year, since.month, since.day)
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return since
+
+
+class SitemapGatherer(GatherBase):
+    """
+        Drop-in alternative to pyblix.Gatherer that reads the article list from
+        a sitemap instead of an HTML index page.
+
+        Sitemap index files are followed and gzipped sitemaps are unpacked on
+        the fly. Every sitemap is parsed incrementally while it downloads and
+        each entry is dropped once it is read, so memory doesn't grow with the
+        size of the sitemap. Only entries whose URL matches `pattern` (a regular
+        expression, searched) and, when `since` is given, whose lastmod is not
+        older than it are gathered; entries without a lastmod are kept.
+
+        With lazy=True (the default) nothing is fetched until the Scanner asks
+        for the articles.
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        verify_ssl: bool,
+        sitemap_url: str,
+        pattern=None,
+        since=None,
+        verbose: bool = False,
+        lazy: bool = True,
+        sessions: SessionPool = None,
+        metrics: Metrics = None,
+    ):
+        super(SitemapGatherer, self).__init__(
+            domain, verify_ssl, sitemap_url, None, verbose
+        )
+        self.sitemap_url = sitemap_url
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.since = _as_moment(since)
+        self.sessions = sessions if sessions is not None else SessionPool()
+        self.metrics = metrics if metrics is not None else Metrics()
+        if not lazy:
+            for _ in self.iter_gather_links():
+                pass
+
+    def _gather(self):
+        pending = [self.sitemap_url]
+        visited = set()
+        while pending:
+            sitemap_url = pending.pop()
+            if sitemap_url in visited:
+                continue
+            visited.add(sitemap_url)
+
+            nested = []
+            for kind, loc, lastmod in self._iter_entries(sitemap_url):
+                if kind == "sitemap":
+                    if self._recent_enough(lastmod):
+                        nested.append(loc)
+                elif self._wanted(loc, lastmod):
+                    glink = self._add_gather_link(loc, loc)
+                    if glink is not None:
+                        yield glink
+            # pop() takes from the end, keep the index file's order.
+            pending.extend(reversed(nested))
+        self._gathered = True
+
+    def _recent_enough(self, lastmod) -> bool:
+        if self.since is None:
+            return True
+        moment = parse_lastmod(lastmod)
+        return moment is None or moment >= self.since
+
+    def _wanted(self, loc: str, lastmod) -> bool:
+        if self.pattern is not None and not self.pattern.search(loc):
+            return False
+        return self._recent_enough(lastmod)
+
+    def _open(self, sitemap_url: str):
+        event = self.metrics.request_started("index_fetch", "GET", sitemap_url)
+        try:
+            response = self.sessions.for_url(sitemap_url).get(
+                url=sitemap_url,
+                verify=self.verify_ssl,
+                headers=self.request_headers,
+                stream=True,
+            )
+        except requests.exceptions.RequestException as ex:
+            self.metrics.request_finished(event, exception=ex)
+            raise InvalidTargetException
+        self.metrics.request_finished(event, response)
+        if response.status_code != 200:
+            response.close()
+            raise InvalidTargetException
+
+        # urllib3 undoes Content-Encoding: gzip. Whether what's left is still a
+        # gzipped file only its first bytes tell: a .gz sitemap may well be
+        # served with that encoding, or under another name.
+        response.raw.decode_content = True
+        head = b""
+        while len(head) < len(GZIP_MAGIC):
+            chunk = response.raw.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            head += chunk
+        stream = _Replayed(head, response.raw)
+        if head.startswith(GZIP_MAGIC):
+            return response, gzip.GzipFile(fileobj=stream)
+        return response, stream
+
+    def _iter_entries(self, sitemap_url: str):
+        """
+            Yield ("url" | "sitemap", loc, lastmod) for every entry of one
+            sitemap, clearing each element as soon as it has been read.
+        """
+        if self.verbose:
+            print(f"Reading sitemap: {sitemap_url}")
+        response, stream = self._open(sitemap_url)
+        root = None
+        try:
+            for event, element in ElementTree.iterparse(stream, ("start", "end")):
+                if root is None:
+                    root = element
+                    continue
+                if event != "end":
+                    continue
+                kind = _local_name(element.tag)
+                if kind not in ("url", "sitemap"):
+                    continue
+
+                loc = lastmod = None
+                for child in element:
+                    name = _local_name(child.tag)
+                    if name == "loc":
+                        loc = (child.text or "").strip()
+                    elif name == "lastmod":
+                        lastmod = child.text
+                if loc:
+                    yield kind, loc, lastmod
+                root.clear()
+        except (ElementTree.ParseError, OSError, EOFError):
+            raise InvalidSitemapException(sitemap_url)
+        finally:
+            response.close()
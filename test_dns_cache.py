@@ -0,0 +1,76 @@
+import socket
+
+import gevent
+import pytest
+
+from dns_cache import DNSCache
+
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 100.0
+
+	def __call__(self):
+		return self.now
+
+
+class FakeResolver(object):
+	def __init__(self, dead=()):
+		self.dead = dead
+		self.asked = []
+
+	def __call__(self, host, port, family, type):
+		self.asked.append(host)
+		if host in self.dead:
+			raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+		return [(socket.AF_INET, type, 6, "", ("10.0.0.1", 0))]
+
+
+def test_hosts_are_resolved_once_per_ttl():
+	clock = FakeClock()
+	resolver = FakeResolver()
+	cache = DNSCache(ttl=60, resolver=resolver, clock=clock)
+
+	assert cache.resolve("a.io") == cache.resolve("a.io")
+	assert resolver.asked == ["a.io"]
+	clock.now += 61
+	cache.resolve("a.io")
+	assert resolver.asked == ["a.io", "a.io"]
+
+
+def test_failed_lookups_are_remembered():
+	clock = FakeClock()
+	resolver = FakeResolver(dead={"gone.io"})
+	cache = DNSCache(negative_ttl=30, resolver=resolver, clock=clock)
+
+	for _ in range(3):
+		with pytest.raises(socket.gaierror):
+			cache.resolve("gone.io")
+	assert resolver.asked == ["gone.io"]
+	clock.now += 31
+	with pytest.raises(socket.gaierror):
+		cache.resolve("gone.io")
+	assert cache.lookups == 2
+
+
+def test_invalid_host_names_are_invalid_urls():
+	def resolver(host, *args):
+		return socket.getaddrinfo(host, *args)
+
+	cache = DNSCache(resolver=resolver)
+	with pytest.raises(ValueError) as error:
+		cache.resolve("a" * 64 + ".example.com")
+	assert type(error.value).__name__ == "InvalidURL"
+	assert len(cache) == 1
+
+
+def test_a_failing_lookup_releases_its_waiters():
+	def resolver(host, *args):
+		gevent.sleep(0.01)
+		raise RuntimeError("resolver broke")
+
+	cache = DNSCache(resolver=resolver)
+	lookups = [gevent.spawn(cache.resolve, "a.io") for _ in range(3)]
+	gevent.joinall(lookups, timeout=5)
+	assert all(type(lookup.exception) is RuntimeError for lookup in lookups)
+	assert cache.lookups == 1 and len(cache) == 0
@@ -0,0 +1,46 @@
+from link_cache import LinkCache
+
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 1_000_000.0
+
+	def __call__(self):
+		return self.now
+
+
+def test_ttl_depends_on_status_class():
+	clock = FakeClock()
+	cache = LinkCache(":memory:", ttl={"2xx": 100, "4xx": 10}, clock=clock)
+	cache.store("https://a.io/", 200, "https://a.io/")
+	cache.store("https://a.io/gone", 404, "https://a.io/gone")
+
+	clock.now += 50
+	assert cache.is_fresh(cache.lookup("https://a.io/"))
+	assert not cache.is_fresh(cache.lookup("https://a.io/gone"))
+
+
+def test_least_recently_used_entries_are_evicted():
+	clock = FakeClock()
+	cache = LinkCache(":memory:", max_entries=2, clock=clock)
+	for n in range(3):
+		clock.now += 1
+		cache.store(f"https://a.io/{n}", 200, "")
+		if n == 1:
+			clock.now += 1
+			cache.lookup("https://a.io/0")
+
+	assert len(cache) == 2
+	assert cache.lookup("https://a.io/1") is None
+	assert cache.lookup("https://a.io/0") is not None
+
+
+def test_entries_survive_reopening(tmp_path):
+	path = str(tmp_path / "links.sqlite")
+	cache = LinkCache(path)
+	cache.store("https://a.io/", 301, "https://b.io/", etag='"v1"')
+	cache.close()
+
+	entry = LinkCache(path).lookup("https://a.io/")
+	assert (entry.status_code, entry.redirect_link) == (301, "https://b.io/")
+	assert entry.validators == {"If-None-Match": '"v1"'}
@@ -0,0 +1,79 @@
+import json
+
+from metrics import Histogram, Metrics
+
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 10.0
+
+	def __call__(self):
+		return self.now
+
+
+def test_histogram_buckets_are_cumulative():
+	h = Histogram(buckets=(0.1, 1.0))
+	for value in (0.05, 0.5, 0.7, 3.0):
+		h.observe(value)
+	assert list(h.cumulative()) == [(0.1, 1), (1.0, 3), (float("inf"), 4)]
+	assert h.count == 4
+
+
+def test_timed_only_counts_time_spent_producing_items():
+	clock = FakeClock()
+	m = Metrics(clock=clock)
+
+	def produce():
+		for item in range(2):
+			clock.now += 1.0
+			yield item
+
+	for _ in m.timed("parse", produce()):
+		clock.now += 5.0
+	assert m.phase_seconds["parse"] == 2.0
+
+
+def test_timed_leaves_out_phases_timed_inside_it():
+	clock = FakeClock()
+	m = Metrics(clock=clock)
+
+	def gather():
+		for item in range(2):
+			clock.now += 3.0
+			yield item
+
+	def fetch(articles):
+		for article in articles:
+			clock.now += 1.0
+			yield article
+
+	assert list(m.timed("article_fetch", fetch(m.timed("index_fetch", gather())), excluding=("index_fetch",))) == [0, 1]
+	assert m.phase_seconds == {"index_fetch": 6.0, "article_fetch": 2.0}
+
+
+def test_requests_are_counted_hooked_and_exported():
+	clock = FakeClock()
+	m = Metrics(clock=clock)
+	started, finished = [], []
+	m.on_request_start.append(started.append)
+	m.on_request_finish.append(finished.append)
+
+	event = m.request_started("link_check", "GET", "https://A.io/x")
+	clock.now += 0.2
+	m.request_finished(event, exception=OSError())
+	m.count("retries", "link_check")
+
+	assert started == finished == [event]
+	assert event.host == "a.io"
+	assert abs(event.elapsed - 0.2) < 1e-9
+
+	exported = json.loads(m.to_json())
+	assert exported["counters"]["requests"] == {"link_check": 1}
+	assert exported["counters"]["responses"] == {"link_check": {"exception": 1}}
+	assert exported["host_latency"]["a.io"]["count"] == 1
+
+	text = m.to_prometheus()
+	assert 'pyblix_retries_total{phase="link_check"} 1' in text
+	assert 'pyblix_responses_total{phase="link_check",status_class="exception"} 1' in text
+	assert 'pyblix_host_latency_seconds_bucket{host="a.io",le="0.25"} 1' in text
+	assert 'pyblix_host_latency_seconds_count{host="a.io"} 1' in text
@@ -0,0 +1,47 @@
+import pytest
+
+from normalizer import LinkNormalizer
+
+
+@pytest.mark.parametrize("link,canonical", [
+	("HTTP://Example.COM:80/a?b=1#top", "http://example.com/a?b=1"),
+	("https://example.com:443", "https://example.com/"),
+	("https://example.com:8443/x", "https://example.com:8443/x"),
+	("https://example.com/post…", "https://example.com/post"),
+	("https://example.com/search?", "https://example.com/search"),
+	("https://User@Example.com/", "https://User@example.com/"),
+	("mailto:someone@example.com", "mailto:someone@example.com"),
+])
+def test_canonicalize(link, canonical):
+	assert LinkNormalizer().canonicalize(link) == canonical
+
+
+def test_sort_query_is_optional():
+	link = "https://example.com/?b=2&a=1"
+	assert LinkNormalizer().canonicalize(link) == link
+	assert LinkNormalizer(sort_query=True).canonicalize(link) == "https://example.com/?a=1&b=2"
+
+
+def test_normalize_keeps_first_appearance_and_counts_collapses():
+	n = LinkNormalizer()
+	links = [
+		"https://b.example/",
+		"https://a.example/page#one",
+		"https://A.example/page",
+		"https://b.example/",
+		"https://a.example:443/page",
+	]
+	assert n.normalize(links) == ["https://b.example/", "https://a.example/page"]
+	assert n.collapsed == {"duplicate": 1, "host_case": 1, "default_port": 1}
+
+	n.normalize(["https://a.example/page#one", "https://a.example/page", "https://a.example/page#two"])
+	assert n.collapsed == {"fragment": 2}
+
+
+def test_canonical_forms_cache_is_bounded():
+	n = LinkNormalizer(cache_size=2)
+	for page in range(5):
+		n.canonicalize(f"https://a.example/{page}")
+	n.canonicalize("https://a.example/4")
+	info = n._canonical_form.cache_info()
+	assert (info.currsize, info.hits) == (2, 1)
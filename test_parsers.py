@@ -0,0 +1,58 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from exceptions import UnknownParserBackendException
+from parsers import HAVE_LXML, extract_links, level_spec, parse_levels, resolve_backend
+from pyblix import GatherLevel, ScanLevel
+
+backends = ["html.parser"] + (["lxml"] if HAVE_LXML else [])
+
+levels = [ScanLevel("article", "class", "single"), GatherLevel("div", "id", "article_index")]
+
+
+@pytest.mark.parametrize("backend", backends)
+@pytest.mark.parametrize("page", ["simple_website.html", "blog_post_1.html", "blog_post_3.html"])
+def test_strained_parse_finds_the_same_elements(backend, page):
+	markup = open(f"tests/{page}").read()
+	full = BeautifulSoup(markup, backend)
+	strained = parse_levels(markup, levels, backend)
+	for level in levels:
+		query = (level.html_tag, {level.html_attrib: level.html_attrib_val})
+		assert list(map(str, strained.find_all(*query))) == list(map(str, full.find_all(*query)))
+
+
+def test_resolve_backend():
+	assert resolve_backend("html.parser") == "html.parser"
+	assert resolve_backend("auto") == ("lxml" if HAVE_LXML else "html.parser")
+	with pytest.raises(UnknownParserBackendException):
+		resolve_backend("regex")
+
+
+def links_of(markup, *scan_levels, backend="html.parser"):
+	return extract_links(markup, [level_spec(level) for level in scan_levels], backend)
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_richer_levels_find_the_same_links(backend):
+	markup = open("tests/blog_post_3.html").read()
+	expected = links_of(markup, levels[0], backend=backend)
+
+	assert expected[0] == 2
+	assert links_of(markup, ScanLevel(css="body > article.single"), backend=backend) == expected
+	assert links_of(markup, ScanLevel(attrs={"class": "single"}), backend=backend) == expected
+	assert links_of(markup, ScanLevel("article", "class", "nope"), backend=backend)[:2] == (0, [])
+
+
+def test_overlapping_levels_count_each_anchor_once():
+	markup = (
+		'<div id="main" class="post body"><a href="/1">1</a>'
+		'<p class="note"><a href="/2">2</a></p></div><p class="note"><a href="/3">3</a></p>'
+	)
+	anchors, hrefs, _ = links_of(
+		markup,
+		ScanLevel("div", attrs={"id": "main", "class": "post"}),
+		ScanLevel("p", "class", "note"),
+		ScanLevel(css="#main p"),
+	)
+	assert (anchors, hrefs) == (3, ["/1", "/2", "/3"])
+	assert links_of(markup, ScanLevel("div", attrs={"id": "main", "class": "other"}))[0] == 0
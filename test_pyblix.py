@@ -1,21 +1,62 @@
 from exceptions import InvalidParentLevelException, InvalidTargetException
 
+import asyncio
+import atexit
+import json
+import socket
+import time
+
+import gevent
 import pytest
 
-from pyblix import Gatherer, GatherLevel
+from aio import AsyncGatherer, AsyncScanner
+from article_store import ArticleStore
+from batch import BatchRun, SiteConfig, load_config, write_reports
+from reports import export
+from checker import CheckOutcome, LinkChecker
+from dns_cache import DNSCache
+from exceptions import HostShortCircuitedException, InvalidShardFileException
+from link_cache import LinkCache
+from parsers import HAVE_LXML
+from result_store import ResultStore
+from pyblix import Gatherer, GatherLevel, GatherLink, NextPageLevel, PageTemplate, ScanLevel, Scanner, ScanResult
+from scheduler import HostLatency, HostScheduler
+from sharding import merge, run_local, shard_of, write_manifest
+from sitemap import SitemapGatherer
 from exceptions import InvalidTargetException, InvalidParentLevelException
 from subprocess import Popen
 from sys import executable
 
 
 pid = Popen([executable, 'spawn_test_server.py'], cwd='tests/')
+atexit.register(pid.terminate)
+
+
+def wait_for_server(address, deadline=5.0):
+	give_up = time.monotonic() + deadline
+	while time.monotonic() < give_up:
+		try:
+			socket.create_connection(address, timeout=0.2).close()
+			return
+		except OSError:
+			time.sleep(0.05)
+
+
+wait_for_server(("127.0.0.1", 8999))
 
 domain = "127.0.0.1:8999"
 bad_root = "http://127.0.0.1:8999/simple_website_not_found.html"
 good_root = "http://127.0.0.1:8999/simple_website.html"
+blog_root = "http://127.0.0.1:8999/blog_index.html"
+paged_root = "http://127.0.0.1:8999/paged/"
+category_root = "http://127.0.0.1:8999/category/"
+relative_root = "http://127.0.0.1:8999/relative/"
+malformed_root = "http://127.0.0.1:8999/malformed/"
+sitemap_root = "http://127.0.0.1:8999/sitemap_index.xml"
 
 bad_gl = GatherLevel("x", "x", "x")
 good_gl = GatherLevel("ul", "id", "articleList")
+article_sl = ScanLevel("article", "class", "single")
 
 use_ssl = False
 
@@ -28,3 +69,650 @@ def test_invalid_target(gatherlevel, domain, root, use_ssl, excep):
 def test_invalid_level(gatherlevel, domain, root, use_ssl, excep):
 	with pytest.raises(excep):
 		g = Gatherer(domain, use_ssl, root, gatherlevel)
+
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 1_000_000.0
+
+	def __call__(self):
+		return self.now
+
+
+def collected_scanner(**scanner_kwargs):
+	g = Gatherer(domain, use_ssl, blog_root, good_gl)
+	s = Scanner(g, **scanner_kwargs)
+	s.add_level(article_sl)
+	s.collect_links()
+	return s
+
+
+def test_collect_links():
+	s = collected_scanner()
+	assert [(r.parent_text, r.scan_link) for r in s.all_results] == [
+		("First Post", "http://127.0.0.1:8999/simple_website.html"),
+		("First Post", "http://127.0.0.1:8999/gone.html"),
+		("First Post", "http://127.0.0.1:8999/blog_post_2.html"),
+		("Second Post", "http://127.0.0.1:8999/simple_website.html"),
+		("Second Post", "http://127.0.0.1:8999/tests_moved"),
+		("Third Post", "http://127.0.0.1:8999/blog_post_1.html"),
+		("Third Post", "http://127.0.0.1:8999/simple_website.html"),
+	]
+
+
+@pytest.mark.parametrize("fetch_workers", [2, 8])
+def test_concurrent_collect_matches_sequential(fetch_workers):
+	sequential = collected_scanner(fetch_workers=1)
+	concurrent = collected_scanner(fetch_workers=fetch_workers)
+	assert [(r.parent_text, r.scan_link) for r in concurrent.all_results] == [
+		(r.parent_text, r.scan_link) for r in sequential.all_results
+	]
+	assert concurrent.get_article_link_dict == sequential.get_article_link_dict
+	assert concurrent.get_normalized_link_list == sequential.get_normalized_link_list
+
+
+def test_outcomes_update_every_occurrence():
+	s = collected_scanner()
+	index = "http://127.0.0.1:8999/simple_website.html"
+	moved = "http://127.0.0.1:8999/tests_moved"
+	s._apply_outcome(CheckOutcome(index, 200, index))
+	s._apply_outcome(CheckOutcome(moved, 301, moved + "/"))
+
+	updated = [r for r in s.all_results if r.scan_done]
+	assert [r.scan_link for r in updated] == [index, index, moved, index]
+	assert updated[2].status_code == 301
+	assert updated[2].result_text.endswith("/tests_moved/")
+
+
+def test_iter_scan_streams_results():
+	s = collected_scanner()
+	streamed = list(s.iter_scan())
+
+	assert sorted(map(id, streamed)) == sorted(map(id, s.all_results))
+	assert all(r.scan_done for r in s.all_results)
+	by_link = {r.scan_link: r for r in s.all_results}
+	assert by_link["http://127.0.0.1:8999/simple_website.html"].status_code == 200
+	assert by_link["http://127.0.0.1:8999/gone.html"].status_code == 404
+	moved = by_link["http://127.0.0.1:8999/tests_moved"]
+	assert moved.status_code == 301
+	assert moved.result_text == "WRN: Moved permanently to http://127.0.0.1:8999/tests_moved/"
+
+
+def test_rate_limited_links_are_retried():
+	checker = LinkChecker(verify_ssl=False, scheduler=HostScheduler(backoff=0))
+	link = "http://127.0.0.1:8999/rate_limited/"
+	outcomes = list(checker.iter_outcomes([link]))
+
+	assert [(o.url, o.status_code) for o in outcomes] == [(link, 200)]
+	assert checker.scheduler.retries == 1
+
+
+def test_connection_errors_are_retried():
+	checker = LinkChecker(
+		scheduler=HostScheduler(backoff=0), breaker_threshold=None, error_retries=2
+	)
+	outcomes = list(checker.iter_outcomes(["http://127.0.0.1:1/"]))
+
+	assert type(outcomes[0].exception).__name__ == "ConnectionError"
+	assert checker.stats.requests == 3 and checker.stats.retries == 2
+	assert "2 retries" in str(checker.stats)
+
+
+def test_slow_requests_are_hedged():
+	latency = HostLatency(min_samples=1)
+	latency.observe("127.0.0.1:8999", 0.0)
+	checker = LinkChecker(verify_ssl=False, hedge=True, latency=latency)
+	outcomes = list(checker.iter_outcomes([good_root]))
+
+	assert [o.status_code for o in outcomes] == [200]
+	assert checker.stats.hedged == 1
+	assert checker.metrics.counters[("hedges", "link_check", None)] == 1
+
+
+def test_head_mode_matches_get_mode():
+	by_get = collected_scanner()
+	by_get.scan_links()
+	by_head = collected_scanner(check_mode="head")
+	by_head.scan_links()
+
+	assert [(r.scan_link, r.status_code, r.result_text) for r in by_head.all_results] == [
+		(r.scan_link, r.status_code, r.result_text) for r in by_get.all_results
+	]
+	stats = by_head.checker.stats
+	assert stats.get_fallbacks == 1  # gone.html, confirmed with a GET
+	assert stats.bytes_saved > 0
+
+
+def test_head_rejected_falls_back_to_streamed_get():
+	checker = LinkChecker(verify_ssl=False, check_mode="head")
+	outcomes = list(checker.iter_outcomes(["http://127.0.0.1:8999/no_head/"]))
+
+	assert [o.status_code for o in outcomes] == [200]
+	assert checker.stats.get_fallbacks == 1
+	assert checker.stats.bytes_saved == len(open("tests/no_head/index.html", "rb").read())
+
+
+def test_link_cache_skips_and_revalidates_requests():
+	clock = FakeClock()
+	cache = LinkCache(":memory:", clock=clock)
+	first = collected_scanner(link_cache=cache)
+	first.scan_links()
+	# blog_post_1/2 are answered by the articles collect_links fetched
+	assert first.checker.stats.requests == 3
+
+	second = collected_scanner(link_cache=cache)
+	second.scan_links()
+	assert second.checker.stats.requests == 0
+	assert second.checker.stats.cache_hits == 3
+
+	clock.now += 30 * 24 * 60 * 60
+	third = collected_scanner(link_cache=cache)
+	third.scan_links()
+	# The fixture server answers If-Modified-Since with 304.
+	assert third.checker.stats.revalidated == 1
+	assert [(r.scan_link, r.result_text) for r in third.all_results] == [
+		(r.scan_link, r.result_text) for r in first.all_results
+	]
+
+
+def test_article_store_skips_unchanged_articles():
+	store = ArticleStore(":memory:")
+	first = collected_scanner(article_store=store)
+	assert first.article_stats == {"new": 3}
+
+	second = collected_scanner(article_store=store)
+	assert second.article_stats == {"unchanged": 3}
+	assert [(r.parent_text, r.scan_link) for r in second.all_results] == [
+		(r.parent_text, r.scan_link) for r in first.all_results
+	]
+	assert second.get_article_link_dict == first.get_article_link_dict
+
+
+class FakeArticleResponse(object):
+	def __init__(self, text):
+		self.status_code = 200
+		self.text = text
+		self.content = text.encode()
+		self.headers = {}
+
+
+def test_article_store_compares_scan_level_frames():
+	store = ArticleStore(":memory:")
+	s = collected_scanner(article_store=store)
+	article = s.all_articles[0]
+	page = '<article class="single"><a href="https://a.io/">a</a></article>{}'
+
+	s._collect_article(article, FakeArticleResponse(page.format("")))
+	s._collect_article(article, FakeArticleResponse(page.format("<p>new sidebar</p>")))
+	assert store.lookup(article.link).links == ["https://a.io/"]
+	s._collect_article(article, FakeArticleResponse(page.replace("a.io", "b.io")))
+	assert store.lookup(article.link).links == ["https://b.io/"]
+	assert s.article_stats == {"new": 3, "changed": 2, "unchanged": 1}
+
+
+def test_parse_workers_match_in_process_parsing():
+	in_process = collected_scanner()
+	in_workers = collected_scanner(parse_workers=2)
+	assert [(r.parent_text, r.scan_link) for r in in_workers.all_results] == [
+		(r.parent_text, r.scan_link) for r in in_process.all_results
+	]
+	assert in_workers.get_article_link_dict == in_process.get_article_link_dict
+	assert in_workers.tmp_total_links == in_process.tmp_total_links
+
+	store = ArticleStore(":memory:")
+	collected_scanner(article_store=store, parse_workers=2)
+	again = collected_scanner(article_store=store, parse_workers=2)
+	assert again.article_stats == {"unchanged": 3}
+
+
+@pytest.mark.skipif(not HAVE_LXML, reason="lxml is not installed")
+def test_lxml_backend_collects_the_same_links():
+	by_default = collected_scanner()
+	by_lxml = collected_scanner(parser="lxml")
+	assert [(r.parent_text, r.scan_link) for r in by_lxml.all_results] == [
+		(r.parent_text, r.scan_link) for r in by_default.all_results
+	]
+
+
+def test_scan_results_are_compact_and_share_their_parent():
+	s = collected_scanner()
+	article = s.all_articles[0]
+	result = s.all_results[0]
+
+	assert not hasattr(result, "__dict__")
+	assert not hasattr(article, "__dict__")
+	assert result.parent_text is article.text
+	assert result.parent_link is article.link
+
+
+def gathered(g):
+	return [(a.text, a.link) for a in g.gather_links]
+
+
+def test_next_page_links_are_followed_and_deduplicated():
+	g = Gatherer(domain, use_ssl, paged_root, good_gl, pagination=NextPageLevel())
+	assert gathered(g) == [
+		("First Post", "http://127.0.0.1:8999/blog_post_1.html"),
+		("Second Post", "http://127.0.0.1:8999/blog_post_2.html"),
+		("Third Post", "http://127.0.0.1:8999/blog_post_3.html"),
+	]
+
+
+def test_page_template_stops_at_the_first_missing_page():
+	g = Gatherer(
+		domain, use_ssl, paged_root, good_gl,
+		pagination=PageTemplate("{root}page/{page}/"),
+	)
+	assert sorted(gathered(g)) == [
+		("First Post", "http://127.0.0.1:8999/blog_post_1.html"),
+		("Second Post", "http://127.0.0.1:8999/blog_post_2.html"),
+		("Third Post", "http://127.0.0.1:8999/blog_post_3.html"),
+	]
+
+
+def test_several_root_pages_are_gathered_once():
+	g = Gatherer(domain, use_ssl, blog_root, good_gl, root_pages=[category_root])
+	assert g.number_of_gather_links == 3
+
+	with pytest.raises(InvalidTargetException):
+		Gatherer(domain, use_ssl, blog_root, good_gl, root_pages=[bad_root])
+
+
+def test_index_fetch_errors_reach_the_crawl():
+	g = Gatherer(domain, use_ssl, blog_root, good_gl, root_pages=[category_root], lazy=True)
+	fetch = g._get
+
+	def broken_get(url):
+		if url == category_root:
+			raise ValueError("bug in the fetch")
+		return fetch(url)
+
+	g._get = broken_get
+	with gevent.Timeout(5), pytest.raises(ValueError):
+		list(g.iter_gather_links())
+
+
+def test_lazy_gatherer_streams_into_the_scanner():
+	g = Gatherer(
+		domain, use_ssl, paged_root, good_gl, pagination=NextPageLevel(), lazy=True,
+	)
+	assert g.gather_links == []
+
+	s = Scanner(g)
+	s.add_level(article_sl)
+	s.collect_links()
+	assert g.number_of_gather_links == 3
+	assert sorted({r.parent_link for r in s.all_results}) == [
+		"http://127.0.0.1:8999/blog_post_1.html",
+		"http://127.0.0.1:8999/blog_post_2.html",
+		"http://127.0.0.1:8999/blog_post_3.html",
+	]
+	assert [a.link for a in g.iter_gather_links()] == [a.link for a in g.gather_links]
+
+
+def test_sitemap_gatherer_follows_indexes_and_gzip():
+	g = SitemapGatherer(domain, use_ssl, sitemap_root, lazy=False)
+	assert [a.link for a in g.gather_links] == [
+		"http://127.0.0.1:8999/blog_post_2.html",
+		"http://127.0.0.1:8999/blog_post_3.html",
+		"http://127.0.0.1:8999/blog_index.html",
+		"http://127.0.0.1:8999/blog_post_1.html",
+	]
+
+
+def test_sitemap_gzip_is_detected_after_transport_encoding():
+	def gathered_from(path):
+		g = SitemapGatherer(domain, use_ssl, f"http://127.0.0.1:8999/{path}", lazy=False)
+		return [a.link for a in g.gather_links]
+
+	assert gathered_from("sitemap_archive.xml.gz") == gathered_from("encoded/sitemap_archive.xml.gz") == [
+		"http://127.0.0.1:8999/blog_post_1.html",
+		"http://127.0.0.1:8999/blog_post_2.html",
+	]
+
+
+def test_sitemap_gatherer_filters_by_pattern_and_lastmod():
+	g = SitemapGatherer(
+		domain, use_ssl, sitemap_root, pattern=r"/blog_post_\d+", since="2020-01-01",
+	)
+	assert [a.link for a in g.iter_gather_links()] == [
+		"http://127.0.0.1:8999/blog_post_2.html",
+		"http://127.0.0.1:8999/blog_post_3.html",
+	]
+
+
+def test_sitemap_gatherer_feeds_the_scanner():
+	s = Scanner(SitemapGatherer(domain, use_ssl, sitemap_root, pattern="blog_post_1"))
+	s.add_level(article_sl)
+	s.collect_links()
+	assert [r.scan_link for r in s.all_results] == [
+		"http://127.0.0.1:8999/simple_website.html",
+		"http://127.0.0.1:8999/gone.html",
+		"http://127.0.0.1:8999/blog_post_2.html",
+	]
+
+	with pytest.raises(InvalidTargetException):
+		list(SitemapGatherer(domain, use_ssl, bad_root).iter_gather_links())
+
+
+def test_phases_and_requests_are_measured():
+	s = collected_scanner()
+	for _ in s.iter_scan():
+		pass
+
+	m = s.metrics
+	assert m is s._for_gatherer.metrics is s.checker.metrics
+	assert set(m.phase_seconds) == {"index_fetch", "article_fetch", "parse", "link_check"}
+	counters = m.to_dict()["counters"]
+	assert counters["requests"]["index_fetch"] == 1
+	assert counters["requests"]["article_fetch"] == 3
+	assert counters["responses"]["link_check"] == {"2xx": 2, "4xx": 1}
+	assert counters["redirects"]["link_check"] == 1
+	assert list(m.host_latency) == ["127.0.0.1:8999"]
+
+
+def test_batch_run_checks_shared_links_once(tmp_path):
+	article_level = ["article", "class", "single"]
+	sites = [
+		SiteConfig("blog", blog_root, ["ul", "id", "articleList"], [article_level], verify_ssl=False),
+		SiteConfig("category", category_root, ["ul", "id", "articleList"], [article_level], verify_ssl=False),
+		SiteConfig("broken", bad_root, ["ul", "id", "articleList"], [article_level], verify_ssl=False),
+	]
+	batch = BatchRun(sites, connections=4)
+	blog, category, broken = batch.run()
+
+	assert blog["articles"] == 3 and category["articles"] == 2
+	assert blog["broken"] == 1
+	assert all(result["result"] for result in blog["results"] + category["results"])
+	assert "InvalidTargetException" in broken["error"]
+	# category only links to pages the blog links to as well, and the posts
+	# were fetched while collecting
+	assert batch.checkers[(False, 3)].stats.requests == 3
+
+	write_reports([blog, category, broken], str(tmp_path))
+	assert sorted(p.name for p in tmp_path.iterdir()) == ["blog.json", "broken.json", "category.json"]
+
+
+def test_batch_config_sets_levels_timeouts_and_check_options(tmp_path):
+	gather_level = ["ul", "id", "articleList"]
+	config = {
+		"connections": 4,
+		"check_mode": "head",
+		"error_retries": 1,
+		"link_cache": str(tmp_path / "links.db"),
+		"sites": [
+			{"name": "blog", "root_page": blog_root, "gather_level": gather_level,
+			 "scan_levels": [{"html_tag": "article", "attrs": {"class": "single"}}], "verify_ssl": False},
+			{"name": "category", "root_page": category_root, "gather_level": gather_level,
+			 "scan_levels": [{"css": "article.single"}], "timeout": 5, "verify_ssl": False},
+		],
+	}
+	path = tmp_path / "sites.json"
+	path.write_text(json.dumps(config))
+	options, sites = load_config(str(path))
+	batch = BatchRun(sites, **options)
+	blog, category = batch.run()
+
+	assert blog["broken"] == 1 and blog["links"] == 7 and category["articles"] == 2
+	assert sorted(batch.checkers) == [(False, 3), (False, 5)]
+	assert [run.scanner.checker for run in batch.runs] == [batch.checkers[(False, 3)], batch.checkers[(False, 5)]]
+	for checker in batch.checkers.values():
+		assert checker.check_mode == "head" and checker.error_retries == 1
+		assert checker.cache is options["link_cache"]
+
+
+def test_dead_hosts_are_short_circuited():
+	checker = LinkChecker(scheduler=HostScheduler(max_per_host=1), breaker_threshold=2)
+	refused = [f"http://127.0.0.1:1/{n}" for n in range(4)]
+	outcomes = list(checker.iter_outcomes(refused + [good_root]))
+
+	errors = [type(o.exception) for o in outcomes if o.url != good_root]
+	assert errors.count(HostShortCircuitedException) == 2
+	assert checker.stats.requests == 3 and checker.stats.short_circuited == 2
+
+	result = ScanResult("Post", blog_root, refused[-1])
+	result.set_result_by_exception(HostShortCircuitedException("127.0.0.1:1", None))
+	assert "not requested" in result.result_text
+
+
+def test_unresolvable_hosts_fail_without_connecting():
+	def resolver(host, *args):
+		if host == "gone.invalid":
+			raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+		return socket.getaddrinfo(host, *args)
+
+	checker = LinkChecker(
+		scheduler=HostScheduler(max_per_host=1), dns_cache=DNSCache(resolver=resolver)
+	)
+	outcomes = list(checker.iter_outcomes(["http://gone.invalid/1", "http://gone.invalid/2"]))
+	assert sorted(type(o.exception).__name__ for o in outcomes) == [
+		"ConnectionError", "HostShortCircuitedException",
+	]
+	assert checker.dns_cache.lookups == 1
+
+
+def test_invalid_host_names_fail_as_invalid_urls():
+	checker = LinkChecker()
+	links = [f"http://{'a' * 64}.example.com/{n}" for n in (1, 2)]
+	outcomes = list(checker.iter_outcomes(links))
+	assert [type(o.exception).__name__ for o in outcomes] == ["InvalidURL", "InvalidURL"]
+
+	result = ScanResult("Post", blog_root, links[0])
+	result.set_result_by_exception(outcomes[0].exception)
+	assert result.result_text == "ERR: URL Invalid"
+
+
+def test_malformed_urls_fail_on_their_own():
+	checker = LinkChecker()
+	outcomes = {o.url: o for o in checker.iter_outcomes(["http://[::1/bad", good_root])}
+
+	assert type(outcomes["http://[::1/bad"].exception).__name__ == "InvalidURL"
+	assert outcomes[good_root].status_code == 200
+	assert len(checker.sessions) == 2
+
+
+def test_connections_use_the_cached_addresses():
+	def resolver(host, *args):
+		# Only the cache knows this name, getaddrinfo would fail on it.
+		assert host == "blog.pyblix.invalid"
+		return socket.getaddrinfo("127.0.0.1", *args)
+
+	checker = LinkChecker(dns_cache=DNSCache(resolver=resolver))
+	links = [f"http://blog.pyblix.invalid:8999/blog_post_{n}.html" for n in (1, 2, 3)]
+	outcomes = list(checker.iter_outcomes(links))
+	assert [o.status_code for o in outcomes] == [200, 200, 200]
+	assert checker.dns_cache.lookups == 1
+
+
+def test_result_store_matches_in_memory_results(tmp_path):
+	in_memory = collected_scanner()
+	stored = collected_scanner(result_store=ResultStore(str(tmp_path / "results.db")))
+
+	assert not isinstance(stored.all_results, list)
+	assert stored._all_results == [] and stored.article_link_dict == {}
+	assert stored.get_normalized_link_list == in_memory.get_normalized_link_list
+	assert stored.get_article_link_dict == in_memory.get_article_link_dict
+	assert list(stored.iter_links_by_article()) == list(in_memory.iter_links_by_article())
+
+	streamed = sorted((r.parent_text, r.scan_link, r.result_text) for r in stored.iter_scan())
+	for _ in in_memory.iter_scan():
+		pass
+	expected = [(r.parent_text, r.scan_link, r.result_text) for r in in_memory.all_results]
+	assert streamed == sorted(expected)
+	assert [(r.parent_text, r.scan_link, r.result_text) for r in stored.all_results] == expected
+
+
+def test_result_store_commits_check_results(tmp_path):
+	path = str(tmp_path / "results.db")
+	s = collected_scanner(result_store=ResultStore(path))
+	s.scan_links()
+
+	# Read from another connection, without closing the scanner's store.
+	reader = ResultStore(path)
+	assert [r[5] for r in reader.iter_rows()] == [r.result_text for r in s.all_results]
+	assert all(r[6] for r in reader.iter_rows())
+
+	article = GatherLink("Late Post", "http://127.0.0.1:8999/late.html")
+	s._record_links(article, 1, ["/simple_website.html"])
+	assert list(s.iter_links_by_article())[-1] == (
+		"Late Post", ["http://127.0.0.1:8999/simple_website.html"]
+	)
+
+
+def test_relative_links_are_resolved_and_fetched_pages_reused():
+	s = Scanner(Gatherer(domain, use_ssl, relative_root, good_gl))
+	s.add_level(article_sl)
+	s.collect_links()
+	index = "http://127.0.0.1:8999/simple_website.html"
+	first_post = "http://127.0.0.1:8999/blog_post_1.html"
+	post = "http://127.0.0.1:8999/relative/post.html"
+
+	assert [r.scan_link for r in s.all_results] == [
+		index, first_post, post + "#comments", "mailto:someone@example.com",
+	]
+	assert s.get_normalized_link_list == s.internal_links == [index, first_post, post]
+	assert s.external_links == []
+	assert s.is_internal(index.upper().replace("HTTP", "http")) and not s.is_internal("https://a.io/")
+
+	s.scan_links()
+	assert s.page_cache_hits == 1
+	assert s.checker.stats.requests == 2
+	assert [r.status_code for r in s.all_results] == [200, 200, 200, 0]
+
+
+def test_malformed_hrefs_are_kept_and_reported():
+	bad = "http://[::1/bad"
+	index = "http://127.0.0.1:8999/simple_website.html"
+	gatherer = Gatherer(domain, use_ssl, malformed_root + "post.html", GatherLevel("article", "class", "single"))
+	assert [glink.link for glink in gatherer.gather_links] == [bad, index]
+
+	s = Scanner(Gatherer(domain, use_ssl, malformed_root, good_gl))
+	s.add_level(article_sl)
+	s.collect_links()
+	assert s.get_normalized_link_list == [bad, index] and s.internal_links == [index]
+	s.scan_links()
+	assert [(r.scan_link, r.result_text) for r in s.all_results] == [
+		(bad, "ERR: URL Invalid"), (index, "OK: All Good!"),
+	]
+
+
+def async_scan(**scanner_kwargs):
+	async def scan():
+		gatherer = AsyncGatherer(domain, use_ssl, blog_root, good_gl)
+		async with AsyncScanner(gatherer, **scanner_kwargs) as scanner:
+			scanner.add_level(article_sl)
+			await scanner.collect_links()
+			streamed = [scan_result async for scan_result in scanner.iter_scan()]
+		return scanner, streamed
+
+	return asyncio.run(scan())
+
+
+def test_async_scanner_matches_the_gevent_scanner():
+	sync = collected_scanner()
+	sync.scan_links()
+	scanner, streamed = async_scan(fetch_workers=2)
+
+	assert sorted(map(id, streamed)) == sorted(map(id, scanner.all_results))
+	assert [(r.parent_text, r.scan_link, r.status_code, r.result_text) for r in scanner.all_results] == [
+		(r.parent_text, r.scan_link, r.status_code, r.result_text) for r in sync.all_results
+	]
+	assert scanner.get_normalized_link_list == sync.get_normalized_link_list
+	assert scanner.session is None
+
+
+def test_async_scanner_fills_the_result_store(tmp_path):
+	in_memory, _ = async_scan()
+	stored, streamed = async_scan(result_store=ResultStore(str(tmp_path / "results.db")))
+
+	assert len(streamed) == len(in_memory.all_results)
+	assert [(r.parent_text, r.scan_link, r.result_text) for r in stored.all_results] == [
+		(r.parent_text, r.scan_link, r.result_text) for r in in_memory.all_results
+	]
+
+
+def test_async_gatherer_does_no_io_until_awaited():
+	gatherer = AsyncGatherer(domain, use_ssl, bad_root, good_gl)
+	assert gatherer.metrics.counters == {}
+	with pytest.raises(InvalidTargetException):
+		asyncio.run(gatherer.gather())
+
+	paged = AsyncGatherer(domain, use_ssl, paged_root, good_gl, pagination=NextPageLevel())
+	links = [glink.link for glink in asyncio.run(paged.gather())]
+	assert links == [glink.link for glink in Gatherer(
+		domain, use_ssl, paged_root, good_gl, pagination=NextPageLevel()
+	).gather_links]
+
+
+def test_async_checks_retry_rate_limited_links():
+	async def check():
+		gatherer = AsyncGatherer(domain, use_ssl, blog_root, good_gl)
+		async with AsyncScanner(gatherer, scheduler=HostScheduler(backoff=0)) as scanner:
+			return scanner, [outcome async for outcome in scanner.iter_outcomes(
+				["http://127.0.0.1:8999/rate_limited/?async", "http://gone.invalid/"]
+			)]
+
+	scanner, outcomes = asyncio.run(check())
+	by_url = {outcome.url: outcome for outcome in outcomes}
+	assert by_url["http://127.0.0.1:8999/rate_limited/?async"].status_code == 200
+	assert type(by_url["http://gone.invalid/"].exception).__name__ == "ConnectionError"
+	assert scanner.scheduler.retries == 1
+
+
+def test_async_checks_time_out_reads_not_downloads():
+	async def check(timeout):
+		gatherer = AsyncGatherer(domain, use_ssl, blog_root, good_gl, timeout=timeout)
+		async with AsyncScanner(gatherer, timeout=timeout) as scanner:
+			outcomes = [outcome async for outcome in scanner.iter_outcomes(["http://127.0.0.1:8999/slow_body"])]
+			_, body = await gatherer._get("http://127.0.0.1:8999/slow_body", "index_fetch")
+			return outcomes, body
+
+	outcomes, body = asyncio.run(check(1))
+	assert [o.status_code for o in outcomes] == [200]
+	assert len(body) == 40 * 1024
+
+
+def test_async_checks_report_hosts_that_cannot_be_resolved():
+	unresolvable = "http://" + "a" * 64 + ".example.com/x"
+
+	async def check():
+		gatherer = AsyncGatherer(domain, use_ssl, blog_root, good_gl)
+		async with AsyncScanner(gatherer) as scanner:
+			return [outcome async for outcome in scanner.iter_outcomes(
+				[unresolvable, "http://127.0.0.1:8999/blog_post_1.html"]
+			)]
+
+	outcomes = {outcome.url: outcome for outcome in asyncio.run(asyncio.wait_for(check(), 10))}
+	assert type(outcomes[unresolvable].exception).__name__ == "InvalidURL"
+	assert outcomes["http://127.0.0.1:8999/blog_post_1.html"].status_code == 200
+
+
+def test_sharded_scan_merges_into_the_in_process_results(tmp_path):
+	manifest = str(tmp_path / "manifest.jsonl")
+	write_manifest(collected_scanner(), manifest, shards=3)
+	partials = run_local(manifest, str(tmp_path / "parts"), processes=2)
+	assert len(partials) == 3
+
+	in_process = collected_scanner()
+	in_process.scan_links()
+	expected = [(r.parent_text, r.scan_link, r.status_code, r.result_text) for r in in_process.all_results]
+	merged = [(r.parent_text, r.scan_link, r.status_code, r.result_text) for r in merge(manifest, partials)]
+	assert merged == expected
+
+	export(merge(manifest, partials), str(tmp_path / "first.jsonl"))
+	export(merge(manifest, partials[::-1] + partials[:1]), str(tmp_path / "second.jsonl"))
+	assert (tmp_path / "first.jsonl").read_bytes() == (tmp_path / "second.jsonl").read_bytes()
+
+	with pytest.raises(InvalidShardFileException):
+		list(merge(manifest, partials[1:]))
+
+
+def test_links_are_sharded_by_host():
+	urls = [f"http://host{n}.example/page/{page}" for n in range(20) for page in range(3)]
+	shards = {}
+	for url in urls:
+		shards.setdefault(url.split("/")[2], set()).add(shard_of(url, 4))
+	assert all(len(found) == 1 for found in shards.values())
+	assert {found.pop() for found in shards.values()} == {0, 1, 2, 3}
+	assert shard_of("http://HOST0.example/", 4) == shard_of("http://host0.example/x", 4)
+	assert shard_of("http://[::1/bad", 4) in range(4)
@@ -0,0 +1,70 @@
+import pytest
+
+from pyblix import ScanResult
+from reports import FORMATS, diff_runs, export, read_export
+
+
+def result(article, link, status_code=None, exception=None):
+	r = ScanResult(article, f"https://blog.io/{article}", link)
+	if exception is not None:
+		r.set_result_by_exception(exception)
+	else:
+		r.set_result_by_status_code(status_code, "https://moved.io/")
+	return r
+
+
+def run(*states):
+	return [result("one", link, status) for link, status in states] + [
+		result("two", "https://b.io/", 200)
+	]
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_exports_round_trip(tmp_path, fmt):
+	path = str(tmp_path / f"run.{fmt}")
+	results = run(("https://a.io/", 404), ("https://c.io/", 301))
+	export(iter(results), path, fmt)
+
+	records = list(read_export(path, fmt))
+	assert [(r["article"], r["link"], r["status_code"], r["exception"]) for r in records] == [
+		("one", "https://a.io/", 404, False),
+		("one", "https://c.io/", 301, False),
+		("two", "https://b.io/", 200, False),
+	]
+
+
+def test_columns_export_writes_each_article_once(tmp_path):
+	path = str(tmp_path / "run.columns.jsonl")
+	export(run(("https://a.io/", 200), ("https://c.io/", 200)), path)
+	assert len(open(path).readlines()) == 2
+
+
+def test_diff_only_reports_news(tmp_path):
+	previous, current = str(tmp_path / "previous.jsonl"), str(tmp_path / "current.jsonl")
+	export(run(("https://a.io/", 404), ("https://c.io/", 200), ("https://d.io/", 200)), previous)
+	export(run(("https://a.io/", 200), ("https://c.io/", 301), ("https://d.io/", 500), ("https://e.io/", 404)), current)
+
+	changes = [(c["change"], c["link"]) for c in diff_runs(read_export(previous), read_export(current))]
+	assert changes == [
+		("fixed", "https://a.io/"),
+		("newly_redirected", "https://c.io/"),
+		("newly_broken", "https://d.io/"),
+		("newly_broken", "https://e.io/"),
+	]
+
+
+def test_columns_export_refuses_articles_out_of_order(tmp_path):
+	results = run(("https://a.io/", 200)) + [result("one", "https://d.io/", 200)]
+	with pytest.raises(ValueError):
+		export(results, str(tmp_path / "run.columns.jsonl"))
+
+
+def test_diff_reports_changed_redirect_targets():
+	previous = [dict(article_link="https://blog.io/one", link="https://a.io/", status_code=301,
+		exception=False, result="WRN: Moved permanently to https://a.io/new")]
+	current = [dict(previous[0], result="WRN: Moved permanently to https://parked.io/")]
+	changes = list(diff_runs(previous, current))
+	assert [(c["change"], c["previous_result"]) for c in changes] == [
+		("redirect_changed", "WRN: Moved permanently to https://a.io/new")
+	]
+	assert list(diff_runs(previous, previous)) == []
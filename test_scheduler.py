@@ -0,0 +1,126 @@
+from scheduler import HostCircuitBreaker, HostLatency, HostScheduler, parse_retry_after
+
+
+class FakeClock(object):
+	def __init__(self):
+		self.now = 100.0
+
+	def __call__(self):
+		return self.now
+
+
+def drain(scheduler):
+	started = []
+	while True:
+		task, _ = scheduler.next_ready()
+		if task is None:
+			return started
+		started.append(task)
+
+
+def test_hosts_are_interleaved_and_capped():
+	s = HostScheduler(max_per_host=2)
+	for url in ["https://a.io/1", "https://a.io/2", "https://a.io/3", "https://b.io/1"]:
+		s.add(url)
+
+	started = drain(s)
+	assert [t.url for t in started] == ["https://a.io/1", "https://b.io/1", "https://a.io/2"]
+	assert s.next_ready() == (None, None)
+
+	s.complete(started[0])
+	task, _ = s.next_ready()
+	assert task.url == "https://a.io/3"
+	for t in started[1:] + [task]:
+		s.complete(t)
+	assert s.finished
+
+
+def test_requests_per_second():
+	clock = FakeClock()
+	s = HostScheduler(requests_per_second=4, clock=clock)
+	s.add("https://a.io/1")
+	s.add("https://a.io/2")
+
+	assert s.next_ready()[0].url == "https://a.io/1"
+	assert s.next_ready() == (None, 0.25)
+	clock.now += 0.25
+	assert s.next_ready()[0].url == "https://a.io/2"
+
+
+def test_retry_after_holds_the_host_back():
+	clock = FakeClock()
+	s = HostScheduler(max_retries=1, clock=clock)
+	task = s.add("https://a.io/1")
+	s.add("https://a.io/2")
+	s.add("https://b.io/1")
+
+	assert s.next_ready()[0] is task
+	assert s.retry(task, retry_after=30)
+	assert [t.url for t in drain(s)] == ["https://b.io/1"]
+	assert s.next_ready() == (None, 30)
+
+	clock.now += 30
+	assert s.next_ready()[0] is task
+	assert not s.retry(task)
+	assert s.retries == 1
+
+
+def test_error_retries_only_hold_back_their_link():
+	clock = FakeClock()
+	s = HostScheduler(backoff=5, clock=clock)
+	task = s.add("https://a.io/1")
+	s.add("https://a.io/2")
+
+	assert s.next_ready()[0] is task
+	assert s.retry(task, hold_host=False)
+	assert [t.url for t in drain(s)] == ["https://a.io/2"]
+	assert s.next_ready() == (None, 5)
+	clock.now += 5
+	assert s.next_ready()[0] is task
+
+
+def test_backoff_is_jittered():
+	clock = FakeClock()
+	s = HostScheduler(backoff=2, jitter=0.5, clock=clock, rng=lambda: 1.0)
+	task = s.add("https://a.io/1")
+	s.next_ready()
+	assert s.retry(task)
+	# 2s backoff, shortened by the full 50% jitter
+	assert s.next_ready() == (None, 1.0)
+
+
+def test_parse_retry_after():
+	assert parse_retry_after("120") == 120
+	assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470) == 10
+	assert parse_retry_after("soon") is None
+	assert parse_retry_after(None) is None
+
+
+def test_circuit_opens_after_consecutive_failures():
+	breaker = HostCircuitBreaker(threshold=2)
+	refused = ConnectionRefusedError()
+
+	breaker.record_failure("a.io", refused)
+	breaker.record_success("a.io")
+	breaker.record_failure("a.io", refused)
+	assert breaker.opened_by("a.io") is None
+
+	breaker.record_failure("a.io", refused)
+	assert breaker.opened_by("a.io") is refused
+	assert breaker.open_hosts == ["a.io"]
+	assert breaker.opened_by("b.io") is None
+
+
+def test_timeouts_follow_host_latency():
+	latency = HostLatency(min_samples=3, multiplier=3, min_timeout=0.5)
+	latency.observe("a.io", 0.1)
+	latency.observe("a.io", 0.2)
+	assert latency.timeout("a.io", 10) == 10
+	assert latency.percentile("a.io", 0.95) is None
+
+	latency.observe("a.io", 0.4)
+	assert latency.percentile("a.io", 0.95) == 0.4
+	assert round(latency.timeout("a.io", 10), 6) == 1.2  # 3 x p99
+	assert latency.timeout("a.io", 1) == 1
+	latency.observe("b.io", 0.01)
+	assert latency.timeout("b.io", 10) == 10
@@ -1,5 +1,68 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TestRequestHandler(SimpleHTTPRequestHandler):
+    hits = {}
+
+    def rate_limited(self):
+        # Answers 429 the first time it is asked, then serves normally.
+        hits = TestRequestHandler.hits
+        hits[self.path] = hits.get(self.path, 0) + 1
+        if hits[self.path] == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return True
+        return False
+
+    def do_HEAD(self):
+        if self.path.startswith("/no_head"):
+            self.send_error(405)
+            return
+        super(TestRequestHandler, self).do_HEAD()
+
+    def encoded_gzip(self):
+        # A .gz file served as is but labelled Content-Encoding: gzip, as
+        # some servers do: the client's transport decoding already unpacks it.
+        with open("sitemap_archive.xml.gz", "rb") as archive:
+            body = archive.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-gzip")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def slow_body(self):
+        # 40 KiB sent over about 2 seconds, no single read waits longer than
+        # 0.5 seconds.
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(40 * 1024))
+        self.end_headers()
+        try:
+            for _ in range(4):
+                self.wfile.write(b"x" * 10 * 1024)
+                self.wfile.flush()
+                time.sleep(0.5)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client had what it needed.
+            pass
+
+    def do_GET(self):
+        if self.path.startswith("/rate_limited") and self.rate_limited():
+            return
+        if self.path == "/encoded/sitemap_archive.xml.gz":
+            self.encoded_gzip()
+            return
+        if self.path == "/slow_body":
+            self.slow_body()
+            return
+        super(TestRequestHandler, self).do_GET()
+
 
 server_address = ('127.0.0.1', 8999)
-httpd = HTTPServer(server_address, SimpleHTTPRequestHandler)
-httpd.serve_forever()
\ No newline at end of file
+httpd = ThreadingHTTPServer(server_address, TestRequestHandler)
+httpd.serve_forever()